@@ -0,0 +1,122 @@
+"""Adaptive difficulty — Elo ratings for players and questions.
+
+Every answer is treated as a match between the player's ability on the
+question's topic and the question's difficulty rating; both move by
+``K * (actual - expected)``. New ratings move fast and settle as their
+answer count grows.
+"""
+import math
+import os
+
+from flask import session
+from flask_login import current_user
+from sqlalchemy import exists
+
+from backend.models import Question, QuestionSeen, UserAbility, db
+
+ADAPTIVE_TARGET_SUCCESS = float(os.getenv("ADAPTIVE_TARGET_SUCCESS", 0.7))
+K_START = 64.0
+K_MIN = 16.0
+SETTLE_ANSWERS = 20
+
+
+def expected_score(ability, difficulty):
+    """Chance that a player rated ``ability`` answers a ``difficulty`` question."""
+    return 1.0 / (1.0 + 10 ** ((difficulty - ability) / 400.0))
+
+
+def k_factor(answered):
+    return max(K_MIN, K_START / (1.0 + answered / SETTLE_ANSWERS))
+
+
+def difficulty_for(rating):
+    """The generation level (easy/medium/hard) nearest to a rating."""
+    return min(Question.DIFFICULTY_RATINGS, key=lambda level: abs(Question.DIFFICULTY_RATINGS[level] - rating))
+
+
+def _starting_rating():
+    level = current_user.preferred_difficulty if current_user.is_authenticated else None
+    return Question.DIFFICULTY_RATINGS.get(level or "medium", 1000.0)
+
+
+def ability(topic_key):
+    """The current player's rating on a topic (guests keep theirs in the session)."""
+    if topic_key and current_user.is_authenticated:
+        row = db.session.get(UserAbility, (current_user.id, topic_key))
+        if row:
+            return row.rating
+    elif topic_key:
+        rating = session.get("abilities", {}).get(topic_key)
+        if rating is not None:
+            return rating
+    return _starting_rating()
+
+
+def record_answer(question, is_correct):
+    """Update the player's topic ability and the question's rating (one row each).
+
+    Callers pass only the first answer to a question of the active quiz.
+    Guests move their own session ability but not the shared question
+    rating. Changes are left in the session for the caller to commit.
+    """
+    actual = 1.0 if is_correct else 0.0
+    topic_key = question.topic_key
+
+    if current_user.is_authenticated and topic_key:
+        player = db.session.get(UserAbility, (current_user.id, topic_key))
+        if player is None:
+            player = UserAbility(user_id=current_user.id, topic_key=topic_key,
+                                 rating=_starting_rating(), answered_count=0)
+            db.session.add(player)
+        rating, answered = player.rating, player.answered_count
+    elif topic_key:
+        rating, answered = ability(topic_key), 0
+    else:
+        # Questions outside the topic pool only calibrate themselves
+        rating, answered = _starting_rating(), None
+
+    surprise = actual - expected_score(rating, question.rating)
+    if answered is not None:
+        new_rating = rating + k_factor(answered) * surprise
+        if current_user.is_authenticated:
+            player.rating = new_rating
+            player.answered_count = answered + 1
+        else:
+            session["abilities"] = {**session.get("abilities", {}), topic_key: round(new_rating, 1)}
+
+    if current_user.is_authenticated:
+        # Applied in SQL so concurrent answers to a shared question all count
+        delta = k_factor(question.answered_count) * surprise
+        Question.query.filter_by(id=question.id).update({
+            Question.rating: Question.rating - delta,
+            Question.answered_count: Question.answered_count + 1,
+        }, synchronize_session=False)
+
+
+def select(topic_key, q_format, rating, count):
+    """Pick ``count`` unseen questions whose rating best matches the player.
+
+    Aims at ``ADAPTIVE_TARGET_SUCCESS`` (a question the player answers
+    correctly ~70% of the time) by walking the (topic_key, q_type, rating)
+    index outward from the target in both directions. Returns an empty list
+    unless the bank can fill the whole quiz.
+    """
+    p = ADAPTIVE_TARGET_SUCCESS
+    target = rating - 400.0 * math.log10(p / (1.0 - p))
+
+    base = Question.query.filter_by(topic_key=topic_key, q_type=q_format)
+    if current_user.is_authenticated:
+        base = base.filter(~exists().where(
+            QuestionSeen.user_id == current_user.id,
+            QuestionSeen.question_id == Question.id,
+        ))
+    elif session.get("seen_pool"):
+        base = base.filter(Question.id.notin_(session["seen_pool"]))
+
+    above = base.filter(Question.rating >= target).order_by(Question.rating.asc()).limit(count).all()
+    below = base.filter(Question.rating < target).order_by(Question.rating.desc()).limit(count).all()
+    picked = sorted(above + below, key=lambda q: abs(q.rating - target))[:count]
+    if len(picked) < count:
+        return []
+    # Easiest first, so the quiz ramps up
+    return sorted(picked, key=lambda q: q.rating)
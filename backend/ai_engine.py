@@ -1,21 +1,51 @@
 """AI Engine — OpenRouter LLM integration for quiz generation & study aids."""
 import json
+import math
 import os
+import random
+import re
+import threading
 import time
-from openai import OpenAI
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from backend import metrics
+from backend.cache import response_cache
+from backend.llm_client import openrouter_client
+from backend.services import chunk_text, compact_text
 
 
 class AIEngine:
     """Handles all AI operations via OpenRouter (supports multiple models)."""
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, cache=None):
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY", "")
+        self.cache = cache or response_cache
         self._client = None
         self._init_error = None
         # Using OpenRouter Free Router to run completely for free
         self.MODEL = "openrouter/free"
         # Faster model for lightweight tasks
         self.FAST_MODEL = "openrouter/free"
+        # Long content is split into chunks that are generated in parallel
+        self.QUESTION_CHUNK_CHARS = int(os.getenv("QUESTION_CHUNK_CHARS", 4000))
+        self.STUDY_CHUNK_CHARS = int(os.getenv("STUDY_CHUNK_CHARS", 3500))
+        self.MAX_CHUNKS = int(os.getenv("MAX_CHUNKS", 8))
+        self.CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", 4))
+        # Token budgets per prompt type; longer content is compacted to its key sentences
+        self.QUESTION_TOKEN_BUDGET = int(os.getenv("QUESTION_TOKEN_BUDGET", 800))
+        self.STUDY_TOKEN_BUDGET = int(os.getenv("STUDY_TOKEN_BUDGET", 700))
+        self.TOPIC_TOKEN_BUDGET = int(os.getenv("TOPIC_TOKEN_BUDGET", 200))
+        # Retry budget per logical call, and per-model circuit breakers
+        self.REQUEST_DEADLINE = float(os.getenv("AI_REQUEST_DEADLINE", 90))
+        self.MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", 3))
+        self.BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", 1.0))
+        self.BACKOFF_CAP = float(os.getenv("AI_BACKOFF_CAP", 20))
+        self.BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", 5))
+        self.BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", 60))
+        self._breakers = {}
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "deadline_exceeded": 0, "short_circuited": 0}
+        self._stats_lock = threading.Lock()
 
     @property
     def client(self):
@@ -27,43 +57,195 @@ class AIEngine:
                 self._init_error = "No API key configured"
             else:
                 try:
-                    self._client = OpenAI(
-                        api_key=key,
-                        base_url="https://openrouter.ai/api/v1",
-                    )
+                    self._client = openrouter_client(key)
                     print(f"[AIEngine] OpenRouter client initialized (key: ...{key[-6:]})")
                 except Exception as e:
                     print(f"[AIEngine] ERROR: Failed to initialize OpenRouter client: {e}")
                     self._init_error = str(e)
         return self._client
 
-    def _request(self, func, *args, **kwargs):
-        """Retry wrapper for API calls."""
+    def _breaker(self, model):
+        with self._stats_lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.BREAKER_THRESHOLD, self.BREAKER_COOLDOWN)
+            return self._breakers[model]
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def request_stats(self):
+        """Retry counters and per-model circuit breaker state, for monitoring."""
+        with self._stats_lock:
+            return {
+                **self._stats,
+                "breakers": {model: b.snapshot() for model, b in self._breakers.items()},
+            }
+
+    @staticmethod
+    def _retry_after(error):
+        """Seconds requested by a Retry-After header on the error's response, if any."""
+        response = getattr(error, "response", None)
+        value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+        try:
+            return max(0.0, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _retryable(error):
+        status = getattr(error, "status_code", None)
+        return status is None or status in (408, 409, 429) or status >= 500
+
+    @staticmethod
+    def _observe(operation, model, started, outcome, result=None):
+        metrics.LLM_DURATION.observe(time.perf_counter() - started, operation, model, outcome)
+        choices = getattr(result, "choices", None)
+        if choices:
+            metrics.LLM_RESPONSE_CHARS.observe(len(choices[0].message.content or ""), operation, model)
+
+    def _request(self, func, *args, deadline=None, operation="request", **kwargs):
+        """Call the API with retries inside one overall deadline.
+
+        Failed attempts back off exponentially with full jitter (or as long
+        as a Retry-After header asks). Each attempt's ``timeout`` is capped
+        by the time left, and client errors other than 408/409/429 are not
+        retried. Repeated failures open the model's circuit breaker, and
+        calls then fail fast until its cool-down ends. Returns None on
+        failure. ``operation`` names the call in the metrics (streams are
+        timed until the stream opens).
+        """
         if not self.client:
             print("[AIEngine] Client not initialized, cannot make request")
             return None
-        
-        for attempt in range(3):
+
+        model = kwargs.get("model", self.MODEL)
+        started = time.perf_counter()
+        breaker = self._breaker(model)
+        if not breaker.allow():
+            self._count("short_circuited")
+            self._observe(operation, model, started, "short_circuited")
+            print(f"[AIEngine] Circuit open for {model} — failing fast")
+            return None
+
+        self._count("calls")
+        ends_at = time.monotonic() + (deadline or self.REQUEST_DEADLINE)
+        requested_timeout = kwargs.get("timeout")
+        for attempt in range(self.MAX_ATTEMPTS):
+            remaining = ends_at - time.monotonic()
+            if remaining <= 0:
+                self._count("deadline_exceeded")
+                break
+            kwargs["timeout"] = min(requested_timeout or remaining, remaining)
+            if attempt:
+                self._count("retries")
+                metrics.LLM_RETRIES.inc(operation, model)
             try:
-                return func(*args, **kwargs)
+                result = func(*args, **kwargs)
+                breaker.record_success()
+                self._observe(operation, model, started, "ok", result)
+                return result
             except Exception as e:
                 print(f"AI attempt {attempt+1} failed: {e}")
-                if attempt < 2:
-                    time.sleep(1.5)
+                if not self._retryable(e):
+                    # The upstream answered; the request itself is at fault
+                    breaker.record_success()
+                    break
+                breaker.record_failure()
+                if attempt + 1 == self.MAX_ATTEMPTS or breaker.state != "closed":
+                    break
+                delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+                retry_after = self._retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if time.monotonic() + delay >= ends_at:
+                    self._count("deadline_exceeded")
+                    break
+                time.sleep(delay)
+        self._count("failures")
+        metrics.LLM_FAILURES.inc(operation, model)
+        self._observe(operation, model, started, "failed")
         return None
 
-    # ── Quiz Generation ──────────────────────────────────────────────
-    def generate_questions(self, content, count=5, q_format="mcq", difficulty="medium"):
-        """Generate quiz questions from content using Llama 3.3."""
-        if not self.client:
-            print("[AIEngine] No client — cannot generate questions")
-            return []
-        if not content:
-            print("[AIEngine] No content provided")
-            return []
+    # ── Chunked Map-Reduce ───────────────────────────────────────────
+    def _chunks(self, content, max_chars):
+        """Split content into chunks, evenly sampling sections past MAX_CHUNKS."""
+        chunks = chunk_text(content, max_chars)
+        if len(chunks) > self.MAX_CHUNKS:
+            step = len(chunks) / self.MAX_CHUNKS
+            chunks = [chunks[int(i * step)] for i in range(self.MAX_CHUNKS)]
+        return chunks
 
-        print(f"[AIEngine] Generating {count} {q_format} questions, difficulty={difficulty}")
+    def _map(self, func, calls):
+        """Run ``func(*args)`` for each args tuple on a bounded pool.
 
+        Yields ``(index, result)`` as calls finish; failed calls yield None.
+        """
+        pool = ThreadPoolExecutor(max_workers=max(1, min(len(calls), self.CHUNK_WORKERS)))
+        try:
+            futures = {pool.submit(func, *args): i for i, args in enumerate(calls)}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    print(f"[AIEngine] Chunk {futures[future]} failed: {e}")
+                    yield futures[future], None
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _question_key(q_data):
+        return re.sub(r"[^a-z0-9]+", " ", str(q_data.get("question", "")).lower()).strip()
+
+    def _question_calls(self, chunks, count, q_format, difficulty, use_cache=True):
+        """Give each chunk a share of ``count`` proportional to its length (at least 1)."""
+        total = sum(len(c) for c in chunks) or 1
+        return [
+            (chunk, max(1, math.ceil(count * len(chunk) / total)), q_format, difficulty, use_cache)
+            for chunk in chunks
+        ]
+
+    def _merge_questions(self, per_chunk, count, seed):
+        """Dedupe across chunks, then sample ``count`` questions spread over the document."""
+        seen, pools = set(), []
+        for questions in per_chunk:
+            pool = []
+            for q_data in questions or []:
+                key = self._question_key(q_data)
+                if key and key not in seen:
+                    seen.add(key)
+                    pool.append(q_data)
+            pools.append(pool)
+
+        # Round-robin in a shuffled chunk order, so a small count isn't all from page 1
+        order = list(range(len(pools)))
+        random.Random(seed).shuffle(order)
+        picked = []
+        while len(picked) < count and any(pools):
+            for i in order:
+                if pools[i] and len(picked) < count:
+                    picked.append((i, len(picked), pools[i].pop(0)))
+        # Present questions in document order
+        return [q_data for _, _, q_data in sorted(picked, key=lambda p: (p[0], p[1]))]
+
+    def _generate_questions_chunked(self, content, count, q_format, difficulty, seed, use_cache=True):
+        chunks = self._chunks(content, self.QUESTION_CHUNK_CHARS)
+        print(f"[AIEngine] Long content ({len(content)} chars) — fanning out over {len(chunks)} chunks")
+        per_chunk = [None] * len(chunks)
+        calls = self._question_calls(chunks, count, q_format, difficulty, use_cache)
+        for i, questions in self._map(self.generate_questions, calls):
+            per_chunk[i] = questions
+        return self._merge_questions(per_chunk, count, seed)
+
+    # ── Quiz Generation ──────────────────────────────────────────────
+    def _question_cache_key(self, content, count, q_format, difficulty):
+        return self.cache.make_key(
+            "questions", model=self.MODEL, content=content, count=int(count),
+            q_format=q_format.lower(), difficulty=difficulty.lower(),
+        )
+
+    def _question_messages(self, content, count, q_format, difficulty):
+        """Build the system/user messages for a question-generation call."""
         diff_guide = {
             "easy": "simple recall and basic understanding",
             "medium": "application and analysis level",
@@ -93,16 +275,46 @@ class AIEngine:
             f"TASK: Generate exactly {count} {q_format.upper()} questions.\n"
             f"DIFFICULTY: {difficulty} — focus on {diff_guide}.\n"
             f"RULE: {format_rule}\n"
-            f"CONTENT:\n{content[:4000]}"
+            f"CONTENT:\n{compact_text(content, self.QUESTION_TOKEN_BUDGET)}"
         )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def generate_questions(self, content, count=5, q_format="mcq", difficulty="medium", use_cache=True):
+        """Generate quiz questions from content using Llama 3.3.
+
+        Pass ``use_cache=False`` when fresh questions are needed (pool refills).
+        """
+        if not self.client:
+            print("[AIEngine] No client — cannot generate questions")
+            return []
+        if not content:
+            print("[AIEngine] No content provided")
+            return []
+
+        cache_key = self._question_cache_key(content, count, q_format, difficulty)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached:
+            print(f"[AIEngine] Cache hit — {len(cached)} questions")
+            return cached
+
+        if len(content) > self.QUESTION_CHUNK_CHARS:
+            questions = self._generate_questions_chunked(
+                content, count, q_format, difficulty, cache_key, use_cache
+            )
+            if questions:
+                self.cache.set(cache_key, questions)
+            return questions
+
+        print(f"[AIEngine] Generating {count} {q_format} questions, difficulty={difficulty}")
 
         try:
             completion = self._request(
                 self.client.chat.completions.create,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
+                operation="generate_questions",
+                messages=self._question_messages(content, count, q_format, difficulty),
                 model=self.MODEL,
                 response_format={"type": "json_object"},
                 temperature=0.3,
@@ -115,6 +327,8 @@ class AIEngine:
                 data = json.loads(raw)
                 questions = data.get("questions", [])
                 print(f"[AIEngine] Parsed {len(questions)} questions")
+                if questions:
+                    self.cache.set(cache_key, questions)
                 return questions
             else:
                 print("[AIEngine] No completion returned after retries")
@@ -124,12 +338,124 @@ class AIEngine:
             traceback.print_exc()
         return []
 
+    def stream_questions(self, content, count=5, q_format="mcq", difficulty="medium", use_cache=True):
+        """Yield questions one at a time as the model streams its JSON back."""
+        if not self.client or not content:
+            return
+
+        cache_key = self._question_cache_key(content, count, q_format, difficulty)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached:
+            print(f"[AIEngine] Cache hit — {len(cached)} questions")
+            yield from cached
+            return
+
+        if len(content) > self.QUESTION_CHUNK_CHARS:
+            yield from self._stream_questions_chunked(
+                content, count, q_format, difficulty, cache_key, use_cache
+            )
+            return
+
+        print(f"[AIEngine] Streaming {count} {q_format} questions, difficulty={difficulty}")
+        stream = self._request(
+            self.client.chat.completions.create,
+            operation="stream_questions",
+            messages=self._question_messages(content, count, q_format, difficulty),
+            model=self.MODEL,
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            max_tokens=2000,
+            timeout=60.0,
+            stream=True,
+        )
+        if not stream:
+            print("[AIEngine] No stream returned after retries")
+            return
+
+        parser = QuestionStreamParser()
+        questions = []
+        streamed_chars = 0
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            streamed_chars += len(delta)
+            for q_data in parser.feed(delta):
+                questions.append(q_data)
+                yield q_data
+        metrics.LLM_RESPONSE_CHARS.observe(streamed_chars, "stream_questions", self.MODEL)
+        print(f"[AIEngine] Streamed {len(questions)} questions")
+        if questions:
+            self.cache.set(cache_key, questions)
+
+    def _stream_questions_chunked(self, content, count, q_format, difficulty, cache_key, use_cache=True):
+        """Yield each chunk's questions as soon as that chunk finishes.
+
+        Every chunk may contribute up to its fair share straight away; the
+        remainder is filled from the leftovers once all chunks are back.
+        """
+        chunks = self._chunks(content, self.QUESTION_CHUNK_CHARS)
+        print(f"[AIEngine] Long content ({len(content)} chars) — streaming over {len(chunks)} chunks")
+        quota = math.ceil(count / len(chunks))
+        seen, leftovers, sent = set(), [], []
+        calls = self._question_calls(chunks, count, q_format, difficulty, use_cache)
+        for _, questions in self._map(self.generate_questions, calls):
+            taken = 0
+            for q_data in questions or []:
+                key = self._question_key(q_data)
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                if taken < quota and len(sent) < count:
+                    taken += 1
+                    sent.append(q_data)
+                    yield q_data
+                else:
+                    leftovers.append(q_data)
+        for q_data in leftovers[:max(0, count - len(sent))]:
+            sent.append(q_data)
+            yield q_data
+        if sent:
+            self.cache.set(cache_key, sent)
+
     # ── Study Material Generation ────────────────────────────────────
-    def generate_study_material(self, content):
-        """Generate study aids: shorthand notes, mnemonics, ELI10, flashcards."""
+    def generate_study_material(self, content, use_cache=True):
+        """Generate study aids: shorthand notes, mnemonics, ELI10, flashcards.
+
+        ``use_cache=False`` asks the model again (the new answer still replaces the cached one).
+        """
         if not self.client:
             return self._fallback_study()
 
+        if len(content) <= self.STUDY_CHUNK_CHARS:
+            return self._study_material(content, use_cache) or self._fallback_study()
+
+        cache_key = self.cache.make_key("study", model=self.MODEL, content=content)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached:
+            return cached
+
+        chunks = self._chunks(content, self.STUDY_CHUNK_CHARS)
+        print(f"[AIEngine] Long content ({len(content)} chars) — study material over {len(chunks)} chunks")
+        per_chunk = [None] * len(chunks)
+        for i, material in self._map(self._study_material, [(c, use_cache) for c in chunks]):
+            per_chunk[i] = material
+        materials = [m for m in per_chunk if m]
+        if not materials:
+            return self._fallback_study()
+        merged = self._merge_study(materials)
+        self.cache.set(cache_key, merged)
+        return merged
+
+    def _study_material(self, content, use_cache=True):
+        """One study-material call for content that fits a single prompt; None on failure."""
+        cache_key = self.cache.make_key("study", model=self.MODEL, content=content)
+        cached = self.cache.get(cache_key) if use_cache else None
+        if cached:
+            return cached
+
         prompt = (
             f"Analyze the following content and return a JSON object with:\n"
             f'- "shorthand_notes": list of concise bullet-point notes\n'
@@ -137,11 +463,12 @@ class AIEngine:
             f'- "mnemonic_story": a creative memory story using key concepts\n'
             f'- "flashcards": list of {{"front": "term", "back": "definition"}}\n'
             f'- "key_concepts": list of 5 most important concepts\n\n'
-            f"CONTENT:\n{content[:3500]}"
+            f"CONTENT:\n{compact_text(content, self.STUDY_TOKEN_BUDGET)}"
         )
         try:
             response = self._request(
                 self.client.chat.completions.create,
+                operation="study_material",
                 model=self.MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 response_format={"type": "json_object"},
@@ -149,10 +476,43 @@ class AIEngine:
                 timeout=35.0,
             )
             if response:
-                return json.loads(response.choices[0].message.content)
+                material = json.loads(response.choices[0].message.content)
+                self.cache.set(cache_key, material)
+                return material
         except Exception:
             pass
-        return self._fallback_study()
+        return None
+
+    @staticmethod
+    def _merge_study(materials):
+        """Combine per-chunk study material into one set, in document order."""
+        notes, flashcards, concepts = [], [], Counter()
+        seen_notes, seen_fronts, first_seen = set(), set(), {}
+        for m in materials:
+            for note in m.get("shorthand_notes") or []:
+                key = str(note).strip().lower()
+                if key and key not in seen_notes:
+                    seen_notes.add(key)
+                    notes.append(note)
+            for card in m.get("flashcards") or []:
+                key = str(card.get("front", "")).strip().lower() if isinstance(card, dict) else ""
+                if key and key not in seen_fronts:
+                    seen_fronts.add(key)
+                    flashcards.append(card)
+            for concept in m.get("key_concepts") or []:
+                key = str(concept).strip().lower()
+                if key:
+                    concepts[key] += 1
+                    first_seen.setdefault(key, (len(first_seen), concept))
+        # Concepts that recur across sections rank first
+        top = sorted(concepts, key=lambda k: (-concepts[k], first_seen[k][0]))[:5]
+        return {
+            "shorthand_notes": notes,
+            "eli10": next((m["eli10"] for m in materials if m.get("eli10")), ""),
+            "mnemonic_story": next((m["mnemonic_story"] for m in materials if m.get("mnemonic_story")), ""),
+            "flashcards": flashcards,
+            "key_concepts": [first_seen[k][1] for k in top],
+        }
 
     def _fallback_study(self):
         return {
@@ -169,9 +529,15 @@ class AIEngine:
         if not self.client or not mistakes:
             return f"Great job on {topic}! Keep exploring related concepts."
 
-        mistake_text = "\n".join(
-            [f"- {m.get('question', '')}" for m in mistakes[:5]]
+        questions = [m.get("question", "") for m in mistakes[:5]]
+        cache_key = self.cache.make_key(
+            "insight", model=self.FAST_MODEL, topic=topic, questions=questions
         )
+        cached = self.cache.get(cache_key)
+        if cached:
+            return cached
+
+        mistake_text = "\n".join([f"- {q}" for q in questions])
         prompt = (
             f"A student took a quiz on '{topic}' and struggled with:\n"
             f"{mistake_text}\n\n"
@@ -182,6 +548,7 @@ class AIEngine:
         try:
             completion = self._request(
                 self.client.chat.completions.create,
+                operation="performance_insight",
                 messages=[{"role": "user", "content": prompt}],
                 model=self.FAST_MODEL,
                 temperature=0.7,
@@ -189,11 +556,32 @@ class AIEngine:
                 timeout=15.0,
             )
             if completion:
-                return completion.choices[0].message.content
+                insight = completion.choices[0].message.content
+                if insight:
+                    self.cache.set(cache_key, insight)
+                return insight
         except Exception:
             pass
         return f"Review the key concepts of {topic} and try again!"
 
+    # ── Health Probe ─────────────────────────────────────────────────
+    def ping(self, timeout=10.0):
+        """One-token completion, no retries — raises if the upstream LLM is unusable."""
+        if not self.client:
+            raise RuntimeError(self._init_error or "Client not initialized")
+        started = time.perf_counter()
+        try:
+            self.client.chat.completions.create(
+                messages=[{"role": "user", "content": "Reply with OK."}],
+                model=self.FAST_MODEL,
+                max_tokens=1,
+                timeout=timeout,
+            )
+        except Exception:
+            self._observe("ping", self.FAST_MODEL, started, "failed")
+            raise
+        self._observe("ping", self.FAST_MODEL, started, "ok")
+
     # ── Fun Fact ─────────────────────────────────────────────────────
     def get_fun_fact(self):
         """Get a random tech/science fun fact."""
@@ -202,6 +590,7 @@ class AIEngine:
         try:
             completion = self._request(
                 self.client.chat.completions.create,
+                operation="fun_fact",
                 messages=[{"role": "user", "content": "Share one amazing, short tech or science fact in one sentence."}],
                 model=self.FAST_MODEL,
                 max_tokens=150,
@@ -221,7 +610,8 @@ class AIEngine:
         try:
             completion = self._request(
                 self.client.chat.completions.create,
-                messages=[{"role": "user", "content": f"Identify the main subject of this text. Return ONLY the topic name in 2-4 words:\n{content[:1000]}"}],
+                operation="detect_topic",
+                messages=[{"role": "user", "content": f"Identify the main subject of this text. Return ONLY the topic name in 2-4 words:\n{compact_text(content, self.TOPIC_TOKEN_BUDGET)}"}],
                 model=self.FAST_MODEL,
                 max_tokens=50,
                 timeout=10.0,
@@ -231,3 +621,140 @@ class AIEngine:
         except Exception:
             pass
         return "General Study"
+
+    # ── Image OCR ────────────────────────────────────────────────────
+    def read_image(self, data_url, model, prompt):
+        """Extract the text of an image (a ``data:`` URL) with a vision model."""
+        if not self.client:
+            return ""
+        completion = self._request(
+            self.client.chat.completions.create,
+            operation="ocr",
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": data_url}},
+                ],
+            }],
+            model=model,
+            max_tokens=2000,
+        )
+        if completion and completion.choices:
+            return (completion.choices[0].message.content or "").strip()
+        return ""
+
+
+class QuestionStreamParser:
+    """Incrementally pull complete objects out of a streamed ``{"questions": [...]}``.
+
+    Tracks bracket nesting and string state across chunks, so each question
+    object can be decoded as soon as its closing brace arrives. A bare
+    top-level array of questions is accepted too.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+
+    def feed(self, text):
+        """Consume a chunk of model output; return any newly completed questions."""
+        self._buf += text
+        done = []
+        while self._pos < len(self._buf):
+            ch = self._buf[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if ch == "{" and self._stack in (["{", "["], ["["]):
+                    self._start = self._pos
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._start is not None and self._stack in (["{", "["], ["["]):
+                    try:
+                        item = json.loads(self._buf[self._start:self._pos + 1])
+                        if isinstance(item, dict) and item.get("question"):
+                            done.append(item)
+                    except ValueError:
+                        pass
+                    self._start = None
+            self._pos += 1
+
+        # Drop text nobody will need again
+        keep = self._start if self._start is not None else self._pos
+        self._buf = self._buf[keep:]
+        self._pos -= keep
+        if self._start is not None:
+            self._start = 0
+        return done
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and fails fast for ``cooldown`` seconds.
+
+    After the cool-down a single trial call is let through (half-open); its
+    success closes the breaker and its failure re-opens it.
+    """
+
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"[AIEngine] Circuit opened after {self.failures} failures")
+            self.trial_running = False
+
+    def snapshot(self):
+        with self._lock:
+            opened_for = time.monotonic() - self.opened_at if self.opened_at is not None else None
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "retry_in_s": round(max(0.0, self.cooldown - opened_for), 1) if opened_for is not None else 0.0,
+            }
@@ -0,0 +1,166 @@
+"""Persistent, content-addressed cache for LLM responses (SQLite, LRU + TTL)."""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+def local_db_path(filename):
+    """Resolve a sidecar SQLite file next to the app (or in /tmp on Vercel)."""
+    if os.environ.get("VERCEL"):
+        return os.path.join(tempfile.gettempdir(), filename)
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), filename)
+
+
+def _normalize(value):
+    """Normalize prompt inputs so trivially different requests share a key."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+class ResponseCache:
+    """SQLite-backed key/value store with LRU eviction, TTL expiry and a size cap.
+
+    Values must be JSON-serialisable. Hit/miss counters are per process.
+    """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        self.path = path or os.getenv("LLM_CACHE_PATH") or local_db_path("llm_cache.db")
+        self.max_entries = int(max_entries or os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+        self.ttl = float(ttl or os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+        self.enabled = os.getenv("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        """Lazily open the cache database (one connection shared across threads)."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " namespace TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(namespace, **parts):
+        """SHA-256 over the namespace and normalized prompt inputs."""
+        payload = json.dumps(
+            {"ns": namespace, "parts": _normalize(parts)},
+            sort_keys=True, ensure_ascii=True, separators=(",", ":"),
+        )
+        return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key):
+        """Return the cached value or None; refreshes the entry's LRU position."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._db()
+                row = conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    conn.commit()
+                    self.misses += 1
+                    self.evictions += 1
+                    return None
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[Cache] Read error: {e}")
+            return None
+
+    def set(self, key, value):
+        """Store a value, then enforce TTL and the size cap."""
+        if not self.enabled:
+            return
+        now = time.time()
+        namespace = key.split(":", 1)[0]
+        try:
+            data = json.dumps(value)
+            with self._lock:
+                conn = self._db()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, namespace, value, created_at, last_access)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, namespace, data, now, now),
+                )
+                self._evict(conn, now)
+                conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[Cache] Write error: {e}")
+
+    def _evict(self, conn, now):
+        expired = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = size - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM llm_cache")
+            self._db().commit()
+
+    def stats(self):
+        """Counters for monitoring (hits/misses are since process start)."""
+        size = 0
+        if self.enabled:
+            try:
+                with self._lock:
+                    size = self._db().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Process-wide cache shared by AIEngine instances
+response_cache = ResponseCache()
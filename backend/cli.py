@@ -0,0 +1,273 @@
+"""Flask CLI maintenance commands (run with ``flask --app main <command>``)."""
+import json
+import random
+import re
+from datetime import date, datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, exists, or_, text
+
+from backend.models import (
+    User, Question, QuestionSeen, QuizResult, TopicMastery, MistakeBank, UserStats,
+    AccuracyRollup, UserAbility, QuestionBand, Document, StudySet, StudyNote, Flashcard, UserStudySet, db,
+)
+
+
+def register_commands(app):
+    app.cli.add_command(backfill_stats)
+    app.cli.add_command(check_query_plans)
+    app.cli.add_command(dedupe_report)
+    app.cli.add_command(fake_llm)
+
+
+@click.command("backfill-stats")
+@with_appcontext
+def backfill_stats():
+    """Rebuild every user's UserStats and AccuracyRollup rows from QuizResult/MistakeBank."""
+    user_ids = [uid for (uid,) in db.session.query(User.id).all()]
+    for user_id in user_ids:
+        db.session.merge(UserStats.compute(user_id))
+
+    AccuracyRollup.query.delete()
+    buckets = {}
+    results = db.session.query(
+        QuizResult.user_id, QuizResult.timestamp, QuizResult.score, QuizResult.total_questions
+    ).filter(QuizResult.user_id.isnot(None), QuizResult.timestamp.isnot(None)).yield_per(1000)
+    for user_id, timestamp, score, total in results:
+        for resolution in AccuracyRollup.RESOLUTIONS:
+            key = (user_id, resolution, AccuracyRollup.bucket_for(resolution, timestamp.date()))
+            counts = buckets.setdefault(key, [0, 0, 0])
+            counts[0] += 1
+            counts[1] += score or 0
+            counts[2] += total or 0
+    db.session.add_all([
+        AccuracyRollup(user_id=u, resolution=r, bucket=b, quiz_count=n, correct=c, total=t)
+        for (u, r, b), (n, c, t) in buckets.items()
+    ])
+    db.session.commit()
+    click.echo(f"Backfilled stats for {len(user_ids)} user(s) and {len(buckets)} accuracy bucket(s).")
+
+
+def hot_queries(user_id=1):
+    """The per-request queries that must be served from an index."""
+    return {
+        "dashboard: user stats": UserStats.query.filter_by(user_id=user_id),
+        "dashboard: topic mastery": TopicMastery.query.filter_by(user_id=user_id),
+        "results: topic mastery lookup": TopicMastery.query.filter_by(user_id=user_id, topic="Biology"),
+        "results: history": QuizResult.query.filter_by(user_id=user_id)
+            .order_by(QuizResult.timestamp.desc()).limit(7),
+        "history: accuracy rollup": AccuracyRollup.query.filter(
+            AccuracyRollup.user_id == user_id, AccuracyRollup.resolution == "day",
+            AccuracyRollup.bucket >= date(2026, 1, 1),
+        ).order_by(AccuracyRollup.bucket.asc()),
+        "library": QuizResult.query.filter_by(user_id=user_id).order_by(QuizResult.timestamp.desc()),
+        "review mistakes": MistakeBank.query.filter_by(user_id=user_id).order_by(MistakeBank.due_at.asc()),
+        "mistake re-quiz": MistakeBank.query.filter_by(user_id=user_id)
+            .filter(MistakeBank.due_at <= datetime.utcnow())
+            .order_by(MistakeBank.due_at.asc()).limit(10),
+        "mistake lookup": MistakeBank.query.filter_by(user_id=user_id, content_hash="0" * 64),
+        "adaptive ability": UserAbility.query.filter_by(user_id=user_id, topic_key="biology"),
+        "adaptive selection": Question.query.filter_by(topic_key="biology", q_type="mcq")
+            .filter(Question.rating >= 1000.0).order_by(Question.rating.asc()).limit(10),
+        "near-duplicate lookup": db.session.query(Question.id, Question.simhash)
+            .join(QuestionBand, QuestionBand.question_id == Question.id)
+            .filter(or_(*(and_(QuestionBand.band == band, QuestionBand.value == band + 1) for band in range(4))))
+            .filter(Question.topic_key == "biology", Question.difficulty == "medium", Question.q_type == "mcq")
+            .filter(~exists().where(QuestionSeen.user_id == user_id, QuestionSeen.question_id == Question.id)),
+        "topic pool draw": Question.query.filter_by(topic_key="biology", difficulty="medium", q_type="mcq")
+            .filter(~exists().where(QuestionSeen.user_id == user_id, QuestionSeen.question_id == Question.id))
+            .limit(10),
+        "document by hash": Document.query.filter_by(sha256="0" * 64).order_by(Document.id.asc()).limit(1),
+        "library: documents": Document.query.filter_by(user_id=user_id)
+            .order_by(Document.last_used_at.desc()).limit(50),
+        "study set by hash": StudySet.query.filter_by(content_hash="0" * 64),
+        "study set notes": StudyNote.query.filter_by(study_set_id=1).order_by(StudyNote.kind, StudyNote.position),
+        "study set flashcards": Flashcard.query.filter_by(study_set_id=1).order_by(Flashcard.position),
+        "library: study sets": db.session.query(StudySet.id, StudySet.title, UserStudySet.opened_at)
+            .join(UserStudySet, UserStudySet.study_set_id == StudySet.id)
+            .filter(UserStudySet.user_id == user_id).order_by(UserStudySet.opened_at.desc()).limit(50),
+    }
+
+
+def full_scans(conn, query):
+    """Return (plan lines, tables read by a full scan) for one query."""
+    dialect = conn.dialect.name
+    sql = str(query.statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    tables = set(db.metadata.tables)
+    if dialect == "sqlite":
+        plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        pattern = re.compile(r"^SCAN (?:TABLE )?\"?(\w+)\"?")
+    elif dialect == "postgresql":
+        # Small tables are always seq-scanned by choice; forbid it to see what's possible
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+        pattern = re.compile(r"Seq Scan on \"?(\w+)\"?")
+    else:
+        raise click.ClickException(f"Query plan check not supported on {dialect}")
+    scanned = set()
+    for line in plan:
+        match = pattern.search(line.strip())
+        if match and match.group(1) in tables:
+            scanned.add(match.group(1))
+    return plan, scanned
+
+
+@click.command("check-query-plans")
+@click.option("--verbose", is_flag=True, help="Print every query plan.")
+@with_appcontext
+def check_query_plans(verbose):
+    """Fail if a hot query falls back to a full table scan."""
+    failures = []
+    with db.engine.connect() as conn:
+        with conn.begin():
+            for name, query in hot_queries().items():
+                plan, scanned = full_scans(conn, query)
+                status = "FULL SCAN of " + ", ".join(sorted(scanned)) if scanned else "ok"
+                click.echo(f"{name:32} {status}")
+                if verbose or scanned:
+                    for line in plan:
+                        click.echo(f"    {line}")
+                if scanned:
+                    failures.append(name)
+    if failures:
+        raise click.ClickException(f"{len(failures)} hot query(ies) use a full table scan")
+
+
+# ── Near-duplicate report ────────────────────────────────────────────
+
+_TEMPLATES = [
+    "What is the primary function of {a} in {b}?",
+    "Which {a} is responsible for {c} in {b}?",
+    "How does {a} affect {c} during {d}?",
+    "Which of the following best describes the role of {a} in {c}?",
+    "What happens to {a} when {b} undergoes {d}?",
+]
+_VOCAB = {
+    "a": ["mitochondria", "ribosomes", "the nucleus", "chlorophyll", "insulin", "enzymes", "ATP", "DNA polymerase"],
+    "b": ["eukaryotic cells", "plant cells", "the liver", "bacteria", "muscle tissue", "the bloodstream"],
+    "c": ["protein synthesis", "photosynthesis", "cell division", "glucose uptake", "respiration", "replication"],
+    "d": ["mitosis", "fasting", "exercise", "infection", "germination", "stress"],
+}
+_ANSWER_VERBS = ["produces", "stores", "breaks down", "transports", "regulates", "synthesizes", "releases", "binds"]
+_ANSWER_OBJECTS = ["energy", "glucose", "amino acids", "oxygen", "genetic material", "lipids", "hormones", "water"]
+
+
+def _rephrase(text, options, rng):
+    """A near-duplicate of a question, the way an LLM tends to repeat itself."""
+    edits = [
+        lambda t: t.lower(),
+        lambda t: t.rstrip("?"),
+        lambda t: t.replace(" of ", " of the ", 1),
+        lambda t: "  ".join(t.split(" ")),
+        lambda t: t.replace("Which of the following", "Which", 1),
+        lambda t: t.replace("What is", "Name", 1),
+    ]
+    for edit in rng.sample(edits, rng.randint(1, 3)):
+        text = edit(text)
+    values = list(options.values())
+    rng.shuffle(values)
+    return text, dict(zip(options, values))
+
+
+def synthetic_corpus(size, duplicate_rate, seed):
+    """Generated-looking questions; ``duplicate_rate`` of them rephrase an earlier one.
+
+    Returns ``(question_text, options, original index)`` tuples. Fresh
+    questions reuse a small vocabulary, so many differ by a single word.
+    """
+    rng = random.Random(seed)
+    answers = [f"It {verb} {obj}" for verb in _ANSWER_VERBS for obj in _ANSWER_OBJECTS]
+    corpus = []
+    for _ in range(size):
+        if corpus and rng.random() < duplicate_rate:
+            text, options, origin = rng.choice(corpus)
+            corpus.append((*_rephrase(text, options, rng), origin))
+        else:
+            words = {slot: rng.choice(choices) for slot, choices in _VOCAB.items()}
+            options = dict(zip("ABCD", rng.sample(answers, 4)))
+            corpus.append((rng.choice(_TEMPLATES).format(**words), options, len(corpus)))
+    return corpus
+
+
+@click.command("dedupe-report")
+@click.option("--size", default=5000, show_default=True, help="Questions in the synthetic corpus.")
+@click.option("--duplicate-rate", default=0.3, show_default=True, help="Share of rephrased repeats.")
+@click.option("--seed", default=7, show_default=True)
+def dedupe_report(size, duplicate_rate, seed):
+    """Measure how much storage near-duplicate linking saves on a synthetic corpus."""
+    from backend.dedupe import bands, distance, question_fingerprint, NEAR_DUPLICATE_BITS
+
+    corpus = synthetic_corpus(size, duplicate_rate, seed)
+    explanation = "Explanation text of typical length for a generated question. " * 3
+
+    index = {}          # (band, value) -> [position in stored]
+    stored = []         # (fingerprint, original index)
+    exact = set()
+    linked = wrong_links = missed = candidates = 0
+    stored_bytes = saved_bytes = 0
+    for question_text, options, origin in corpus:
+        options_json = json.dumps(options)
+        row_bytes = len(question_text.encode()) + len(options_json) + len(explanation)
+        exact.add((question_text, options_json))
+        fp = question_fingerprint(question_text, options_json)
+        near = {pos for key in bands(fp) for pos in index.get(key, ())}
+        candidates += len(near)
+        match = next((pos for pos in near if distance(fp, stored[pos][0]) <= NEAR_DUPLICATE_BITS), None)
+        if match is not None:
+            linked += 1
+            saved_bytes += row_bytes
+            if stored[match][1] != origin:
+                wrong_links += 1
+            continue
+        if any(o == origin for _, o in stored):
+            missed += 1
+        for key in bands(fp):
+            index.setdefault(key, []).append(len(stored))
+        stored.append((fp, origin))
+        stored_bytes += row_bytes
+
+    total = len(corpus)
+    originals = len({origin for _, _, origin in corpus})
+    band_bytes = len(stored) * len(bands(0)) * 12
+    click.echo(f"Synthetic corpus:        {total} questions ({duplicate_rate:.0%} rephrased repeats, seed {seed})")
+    click.echo(f"Distinct questions:      {originals}")
+    click.echo(f"Exact dedupe keeps:      {len(exact)}")
+    click.echo(f"SimHash dedupe keeps:    {len(stored)} ({linked} linked, {missed} repeats missed)")
+    click.echo(f"Wrong links:             {wrong_links}")
+    click.echo(f"Candidates checked:      {candidates / total:.2f} per insert")
+    click.echo(f"Row storage:             {(stored_bytes + saved_bytes) / 1024:.0f} KiB -> "
+               f"{stored_bytes / 1024:.0f} KiB (+{band_bytes / 1024:.0f} KiB band index), "
+               f"{saved_bytes / (stored_bytes + saved_bytes):.0%} saved")
+
+
+# ── Offline LLM ──────────────────────────────────────────────────────
+
+@click.command("fake-llm")
+@click.option("--fixtures", default="fixtures/llm", show_default=True,
+              help="Directory of completions recorded with LLM_RECORD_DIR.")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8099, show_default=True)
+@click.option("--latency", default="recorded", show_default=True,
+              help="fixed:MS, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or recorded[:SCALE].")
+@click.option("--error-rate", default=0.0, show_default=True, help="Share of requests answered with an error.")
+@click.option("--error-statuses", default="429,500,503", show_default=True)
+@click.option("--chunk-chars", default=24, show_default=True, help="Characters per streamed chunk.")
+@click.option("--chunk-delay", default=20.0, show_default=True, help="Milliseconds between streamed chunks.")
+@click.option("--seed", default=None, type=int, help="Seed for error injection.")
+def fake_llm(fixtures, host, port, latency, error_rate, error_statuses, chunk_chars, chunk_delay, seed):
+    """Serve recorded completions from a local OpenAI-compatible endpoint."""
+    from backend.llm_replay import FakeLLMServer
+
+    server = FakeLLMServer(
+        fixtures, host=host, port=port, latency=latency, error_rate=error_rate,
+        error_statuses=[int(s) for s in error_statuses.split(",") if s.strip()],
+        chunk_chars=chunk_chars, chunk_delay_ms=chunk_delay, seed=seed,
+    )
+    click.echo(f"Serving {server.store.count} fixture(s) at {server.base_url} "
+               f"(latency {latency}, error rate {error_rate:.0%})")
+    click.echo(f"Run the app with OPENROUTER_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,185 @@
+"""Near-duplicate question detection with a banded 64-bit SimHash index.
+
+Each stored question gets a SimHash of the content words in its text and
+options. Two questions whose fingerprints differ in at most
+``NEAR_DUPLICATE_BITS`` bits are treated as the same question. Every fingerprint is split into ``BANDS``
+16-bit bands, and each (band, value) pair is indexed in ``question_band``.
+By the pigeonhole principle, any match within the threshold agrees exactly
+on at least one band, so candidates are found with indexed equality lookups
+and then confirmed by Hamming distance.
+"""
+import hashlib
+import json
+import re
+
+from sqlalchemy import and_, exists, insert, or_
+
+from backend.models import Question, QuestionBand, QuestionSeen, db, bulk_insert_questions
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+NEAR_DUPLICATE_BITS = 3
+
+_MASK = (1 << FINGERPRINT_BITS) - 1
+_BAND_MASK = (1 << BAND_BITS) - 1
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an the of in on for to and or is are was were be been by with as at from into "
+    "what which who whom whose how why when where does do did this that these those it its "
+    "following best".split()
+)
+
+
+def fingerprint(text):
+    """Signed 64-bit SimHash of the content words in ``text`` (fits a BIGINT column)."""
+    weights = [0] * FINGERPRINT_BITS
+    for word in _WORD.findall((text or "").lower()):
+        if word in STOPWORDS:
+            continue
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+    return value - (1 << FINGERPRINT_BITS) if value >> (FINGERPRINT_BITS - 1) else value
+
+
+def question_fingerprint(question_text, options_json=None):
+    """Fingerprint a question together with its option texts.
+
+    Short questions that differ in a single word can land within the
+    threshold on their own; the options add enough content to tell them
+    apart, and as a bag of words they ignore option order.
+    """
+    try:
+        options = json.loads(options_json) if options_json else {}
+    except ValueError:
+        options = {}
+    values = options.values() if isinstance(options, dict) else options
+    return fingerprint(" ".join([question_text or "", *map(str, values)]))
+
+
+def bands(fp):
+    """The (band, value) pairs indexed for a fingerprint."""
+    fp &= _MASK
+    return [(band, fp >> (band * BAND_BITS) & _BAND_MASK) for band in range(BANDS)]
+
+
+def distance(a, b):
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def scope(row):
+    """Which stored questions a row may be linked to.
+
+    Only questions drawn from the same pool (topic, difficulty and format)
+    are interchangeable; questions outside any pool also stay with their owner,
+    and a guest's (no owner) are only linked within the same batch.
+    """
+    topic_key = row.get("topic_key")
+    return (topic_key, row.get("difficulty") or "medium", row.get("q_type") or "mcq",
+            None if topic_key else row.get("user_id"))
+
+
+def _closest(fp, row_scope, candidates):
+    """Return the ref of the nearest candidate within the threshold, or None."""
+    best, best_distance = None, NEAR_DUPLICATE_BITS + 1
+    for other_fp, other_scope, ref in candidates:
+        if other_scope != row_scope:
+            continue
+        d = distance(fp, other_fp)
+        if d < best_distance:
+            best, best_distance = ref, d
+    return best
+
+
+def _indexed_matches(fps, row_scope, seen_by=None, seen_ids=()):
+    """Stored questions in ``row_scope`` sharing at least one band with any of ``fps``.
+
+    Questions already served to ``seen_by`` (or listed in ``seen_ids``) are
+    left out, so a fresh generation is never swapped for one the player has had.
+    """
+    topic_key, difficulty, q_type, owner = row_scope
+    keys = {pair for fp in fps for pair in bands(fp)}
+    if not keys or (not topic_key and owner is None):
+        # Stored guest questions can't be told apart by owner, so never share them
+        return []
+    query = db.session.query(Question.id, Question.simhash) \
+        .join(QuestionBand, QuestionBand.question_id == Question.id) \
+        .filter(or_(*(and_(QuestionBand.band == band, QuestionBand.value == value)
+                      for band, value in sorted(keys)))) \
+        .filter(Question.difficulty == difficulty, Question.q_type == q_type)
+    if topic_key:
+        query = query.filter(Question.topic_key == topic_key)
+    else:
+        query = query.filter(Question.topic_key.is_(None), Question.user_id == owner)
+    if seen_by is not None:
+        query = query.filter(~exists().where(
+            QuestionSeen.user_id == seen_by,
+            QuestionSeen.question_id == Question.id,
+        ))
+    if seen_ids:
+        query = query.filter(Question.id.notin_(list(seen_ids)))
+    return [(simhash, row_scope, q_id) for q_id, simhash in query.distinct().all()]
+
+
+def index_questions(pairs):
+    """Add band rows for ``(question_id, fingerprint)`` pairs."""
+    rows = [{"question_id": q_id, "band": band, "value": value}
+            for q_id, fp in pairs for band, value in bands(fp)]
+    if rows:
+        db.session.execute(insert(QuestionBand), rows)
+
+
+def store_questions(rows, recent=None, seen_by=None, seen_ids=()):
+    """Insert question rows, linking near-duplicates instead of storing them again.
+
+    Returns one id per input row: a new row's id, or the id of the stored
+    question (or earlier row in the same batch) it duplicates. A row is only
+    linked within its ``scope``, and never to a question already served to
+    user ``seen_by`` or listed in ``seen_ids`` (a guest's ``seen_pool``);
+    those are inserted afresh. ``recent`` is a list of ``(fingerprint,
+    scope, id)`` that callers inserting one question at a time pass back in
+    to dedupe across calls; it is extended in place. Changes are left in the
+    session for the caller to commit.
+    """
+    recent = [] if recent is None else recent
+    fps = [question_fingerprint(row["question_text"], row.get("options_json")) for row in rows]
+    scopes = [scope(row) for row in rows]
+    stored = []
+    for row_scope in dict.fromkeys(scopes):
+        stored += _indexed_matches([fp for fp, s in zip(fps, scopes) if s == row_scope],
+                                   row_scope, seen_by, seen_ids)
+
+    ids = [None] * len(rows)
+    batch, batch_links, new_rows, new_positions = [], [], [], []
+    for i, (row, fp, row_scope) in enumerate(zip(rows, fps, scopes)):
+        match = _closest(fp, row_scope, recent) or _closest(fp, row_scope, stored)
+        if match is not None:
+            ids[i] = match
+            continue
+        earlier = _closest(fp, row_scope, batch)
+        if earlier is not None:
+            batch_links.append((i, earlier))
+            continue
+        batch.append((fp, row_scope, i))
+        new_rows.append({**row, "simhash": fp})
+        new_positions.append(i)
+
+    new_ids = bulk_insert_questions(new_rows)
+    for i, q_id in zip(new_positions, new_ids):
+        ids[i] = q_id
+    for i, earlier in batch_links:
+        ids[i] = ids[earlier]
+    index_questions([(ids[i], fps[i]) for i in new_positions])
+    recent.extend((fps[i], scopes[i], ids[i]) for i in new_positions)
+
+    linked = len(rows) - len(new_rows)
+    if linked:
+        print(f"[Dedupe] Linked {linked} of {len(rows)} question(s) to near-duplicates")
+    return ids
+
+
+def unique_ids(ids):
+    """Drop repeats (linked duplicates) while keeping quiz order."""
+    return list(dict.fromkeys(q_id for q_id in ids if q_id is not None))
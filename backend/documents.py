@@ -0,0 +1,123 @@
+"""Uploaded documents — extracted once, reused by the SHA-256 of the uploaded bytes.
+
+The hash is computed while the multipart body is parsed: ``HashingRequest``
+wraps each upload's spool file so every chunk Werkzeug writes is also fed
+to SHA-256. Looking a document up therefore costs no extra pass over the
+file, and a re-upload of the same bytes skips extraction (and the vision
+call for images) entirely.
+"""
+import hashlib
+import io
+from datetime import datetime
+
+from flask import Request
+
+from backend.models import Document, db
+from backend.services import clean_text, extract_pdf, extract_text_from_image
+
+_CHUNK = 64 * 1024
+
+
+class HashingStream:
+    """Write-through wrapper that hashes everything written to ``stream``."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self._sha256.update(data)
+        return self._stream.write(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __iter__(self):
+        return iter(self._stream)
+
+
+class HashingRequest(Request):
+    """Request whose file uploads are hashed as they stream in."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingStream(super()._get_file_stream(total_content_length, content_type, filename, content_length))
+
+
+def digest(upload):
+    """SHA-256 of an upload: from the streaming hash, or by reading it in chunks."""
+    stream = upload.stream
+    if isinstance(stream, HashingStream):
+        return stream.sha256
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(_CHUNK), b""):
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+
+def find(sha256):
+    """Any stored document with these bytes (its text is the same for every owner)."""
+    if not sha256:
+        return None
+    return Document.query.filter_by(sha256=sha256).order_by(Document.id.asc()).first()
+
+
+def owned(document_id, user_id):
+    document = db.session.get(Document, document_id)
+    if document is None or user_id is None or document.user_id != user_id:
+        return None
+    return document
+
+
+def load(kind, user_id, sha256, upload=None, filename=None):
+    """The user's document for an upload, extracting its text only if the bytes are new.
+
+    ``upload`` may be None when the hash is already known to be stored.
+    Returns None when nothing could be extracted. Changes are left in the
+    session for the caller to commit.
+    """
+    now = datetime.utcnow()
+    filename = filename or (upload.filename if upload else None)
+    mine = Document.query.filter_by(user_id=user_id, sha256=sha256).first() if sha256 else None
+    if mine is not None:
+        mine.last_used_at = now
+        print(f"[Documents] Reusing text of {mine.label} ({len(mine.text)} chars)")
+        return mine
+
+    existing = find(sha256)
+    if existing is not None:
+        text, page_count, topic, size = existing.text, existing.page_count, existing.topic, existing.size_bytes
+        print(f"[Documents] Reusing extracted text for {filename} ({len(text)} chars)")
+    elif upload is not None:
+        upload.stream.seek(0, io.SEEK_END)
+        topic, size = None, upload.stream.tell()
+        upload.stream.seek(0)
+        if kind == "pdf":
+            text, page_count = extract_pdf(upload)
+        else:
+            page_count = None
+            text = extract_text_from_image(upload)
+        text = clean_text(text, keep_paragraphs=True)
+    else:
+        return None
+
+    if not text:
+        return None
+    document = Document(
+        user_id=user_id, sha256=sha256, kind=kind, filename=filename, size_bytes=size,
+        page_count=page_count, topic=topic, text=text, created_at=now, last_used_at=now,
+    )
+    db.session.add(document)
+    db.session.flush()
+    return document
+
+
+def library(user_id, limit=50):
+    """A user's documents, most recently used first."""
+    return Document.query.filter_by(user_id=user_id) \
+        .order_by(Document.last_used_at.desc()).limit(limit).all()
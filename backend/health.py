@@ -0,0 +1,106 @@
+"""Health checks — a background prober keeps the upstream LLM status in memory."""
+import os
+import threading
+import time
+from collections import deque
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class HealthProber:
+    """Calls ``probe(timeout)`` on an interval and remembers the outcomes.
+
+    ``/health`` reads :meth:`status` without doing any I/O. The thread is
+    started on first use, so CLI commands and imports never spawn it.
+    Set ``HEALTH_PROBE_INTERVAL=0`` to probe only on demand.
+    """
+
+    def __init__(self, probe, interval=None, timeout=None, history=None, min_on_demand=None):
+        self.probe = probe
+        self.interval = float(interval if interval is not None else os.getenv("HEALTH_PROBE_INTERVAL", 300))
+        self.timeout = float(timeout or os.getenv("HEALTH_PROBE_TIMEOUT", 10))
+        self.min_on_demand = float(
+            min_on_demand if min_on_demand is not None else os.getenv("HEALTH_DEEP_MIN_INTERVAL", 30)
+        )
+        self.history = deque(maxlen=int(history or os.getenv("HEALTH_PROBE_HISTORY", 50)))
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._thread = None
+        self._last_on_demand = 0.0
+
+    def ensure_started(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="health-probe", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self.run_probe()
+            time.sleep(self.interval)
+
+    def run_probe(self):
+        """Probe the upstream once and record the result."""
+        with self._probe_lock:
+            started = time.time()
+            error = None
+            try:
+                self.probe(self.timeout)
+            except Exception as e:
+                error = str(e)
+            entry = {
+                "at": started,
+                "ok": error is None,
+                "latency_ms": round((time.time() - started) * 1000, 1),
+                "error": error,
+            }
+            with self._lock:
+                self.history.append(entry)
+        if error:
+            print(f"[Health] LLM probe failed: {error}")
+        return entry
+
+    def probe_on_demand(self):
+        """Run a probe unless one was requested recently; return seconds to wait otherwise."""
+        with self._lock:
+            wait = self._last_on_demand + self.min_on_demand - time.time()
+            if wait > 0:
+                return None, wait
+            self._last_on_demand = time.time()
+        return self.run_probe(), 0
+
+    def status(self):
+        """Latest probe outcome, from memory."""
+        with self._lock:
+            last = self.history[-1] if self.history else None
+        if last is None:
+            return {"llm_status": "unknown", "llm_checked_ago_s": None, "llm_latency_ms": None}
+        return {
+            "llm_status": "ok" if last["ok"] else "failing",
+            "llm_checked_ago_s": round(time.time() - last["at"], 1),
+            "llm_latency_ms": last["latency_ms"],
+        }
+
+    def report(self):
+        """Probe history with latency percentiles over the successful probes."""
+        with self._lock:
+            entries = list(self.history)
+        latencies = [e["latency_ms"] for e in entries if e["ok"]]
+        return {
+            **self.status(),
+            "probes": len(entries),
+            "failures": sum(1 for e in entries if not e["ok"]),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "interval_s": self.interval,
+            "history": entries,
+        }
@@ -0,0 +1,171 @@
+"""Background job queue — bounded worker pool with SQLite-backed job status.
+
+On Vercel (or with ``JOB_QUEUE=inline``) jobs run synchronously inside the
+request that submits them: a serverless function is frozen once its
+response is sent, and each instance has its own /tmp, so a background
+thread might never finish and a later poll could land on another instance.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from backend.cache import local_db_path
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting for a worker."""
+
+
+class JobQueue:
+    """Runs callables on a bounded thread pool and tracks them in SQLite.
+
+    Job functions are called as ``func(job_id, *args, **kwargs)`` inside an
+    application context, and may call :meth:`update` to report progress.
+    Whatever they return is stored as the job's JSON result. When
+    ``inline`` is set, :meth:`submit` runs the job before returning.
+    """
+
+    def __init__(self, path=None, max_workers=None, max_pending=None, retention=None):
+        self.path = path or os.getenv("JOB_QUEUE_PATH") or local_db_path("jobs.db")
+        self.max_workers = int(max_workers or os.getenv("GENERATION_WORKERS", 4))
+        self.max_pending = int(max_pending or os.getenv("GENERATION_MAX_PENDING", 64))
+        self.retention = float(retention or os.getenv("JOB_RETENTION_SECONDS", 24 * 3600))
+        # Waiters re-read the job row this often, so updates written by
+        # another server process are noticed without an in-process wakeup
+        self.poll_interval = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+        mode = os.getenv("JOB_QUEUE") or ("inline" if os.environ.get("VERCEL") else "thread")
+        self.inline = mode.lower() == "inline"
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " owner TEXT,"
+                " status TEXT NOT NULL,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_updated_at ON jobs (updated_at)")
+            self._conn.commit()
+        return self._conn
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="quiz-job"
+            )
+        return self._executor
+
+    def submit(self, kind, func, *args, owner=None, **kwargs):
+        """Enqueue ``func`` and return the new job id (immediately, unless inline)."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull("Too many quizzes are being generated right now. Please try again shortly.")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.retention,))
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, owner, now, now),
+            )
+            conn.commit()
+
+        app = current_app._get_current_object()
+        if self.inline:
+            print(f"[Jobs] Running {kind} job {job_id} inline")
+            self._run(app, job_id, func, args, kwargs)
+            return job_id
+        try:
+            self.executor.submit(self._run, app, job_id, func, args, kwargs)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        print(f"[Jobs] Queued {kind} job {job_id}")
+        return job_id
+
+    def _run(self, app, job_id, func, args, kwargs):
+        started = time.time()
+        try:
+            self.update(job_id, status="running")
+            with app.app_context():
+                result = func(job_id, *args, **kwargs)
+            self.update(job_id, status="done", result=result)
+            print(f"[Jobs] Job {job_id} done in {time.time() - started:.1f}s")
+        except Exception as e:
+            print(f"[Jobs] Job {job_id} failed: {e}")
+            self.update(job_id, status="failed", error=str(e))
+        finally:
+            self._slots.release()
+
+    def update(self, job_id, status=None, result=None, error=None):
+        """Record progress on a job and wake anyone waiting on it."""
+        fields, values = ["updated_at = ?"], [time.time()]
+        if status is not None:
+            fields.append("status = ?")
+            values.append(status)
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result))
+        if error is not None:
+            fields.append("error = ?")
+            values.append(error)
+        with self._changed:
+            conn = self._db()
+            conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id = ?", (*values, job_id))
+            conn.commit()
+            self._changed.notify_all()
+
+    def get(self, job_id):
+        """Return the job as a dict (result decoded), or None if unknown."""
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def wait(self, job_id, since, timeout=15.0):
+        """Block until the job is updated after ``since`` (or timeout); return it.
+
+        Updates from this process wake the waiter at once; the row is also
+        re-read every ``poll_interval`` seconds for jobs run by other workers.
+        """
+        deadline = time.time() + timeout
+        with self._changed:
+            while True:
+                row = self._db().execute(
+                    "SELECT updated_at FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                remaining = deadline - time.time()
+                if row is None or row[0] > since or remaining <= 0:
+                    break
+                self._changed.wait(min(remaining, self.poll_interval))
+        return self.get(job_id)
+
+
+# Process-wide queue used by the routes
+job_queue = JobQueue()
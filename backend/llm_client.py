@@ -0,0 +1,74 @@
+"""Process-wide pooled HTTP transport for all OpenRouter traffic."""
+import importlib.util
+import os
+import threading
+
+import httpx
+from openai import OpenAI
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+_lock = threading.RLock()
+_http_client = None
+_clients = {}
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def http_client():
+    """The shared httpx client: capped connections, keep-alive, HTTP/2 when ``h2`` is installed."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                http2 = _env_flag("LLM_HTTP2", "true")
+                if http2 and importlib.util.find_spec("h2") is None:
+                    print("[LLM] Warning: LLM_HTTP2 is on but h2 is not installed "
+                          "(pip install 'httpx[http2]'); using HTTP/1.1")
+                    http2 = False
+                transport = httpx.HTTPTransport(
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 20)),
+                        max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 10)),
+                        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+                    ),
+                )
+                record_dir = os.getenv("LLM_RECORD_DIR")
+                if record_dir:
+                    from backend.llm_replay import RecordingTransport
+                    transport = RecordingTransport(transport, record_dir)
+                    print(f"[LLM] Recording completions to {record_dir}")
+                _http_client = httpx.Client(
+                    transport=transport,
+                    # Waiting for a free connection is bounded too, so a saturated pool fails loudly
+                    timeout=httpx.Timeout(60.0, connect=10.0, pool=float(os.getenv("LLM_POOL_TIMEOUT", 30))),
+                    follow_redirects=True,
+                )
+                print(f"[LLM] Shared HTTP client ready (HTTP/2: {'on' if http2 else 'off'})")
+    return _http_client
+
+
+def openrouter_client(api_key=None):
+    """An OpenAI-compatible client for OpenRouter on the shared transport (one per key).
+
+    Retries are left to the caller (see ``AIEngine._request``).
+    """
+    key = api_key or os.getenv("OPENROUTER_API_KEY", "")
+    if not key:
+        return None
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenAI(
+                    api_key=key,
+                    base_url=OPENROUTER_BASE_URL,
+                    http_client=http_client(),
+                    max_retries=0,
+                )
+                _clients[key] = client
+    return client
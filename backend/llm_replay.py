@@ -0,0 +1,371 @@
+"""Record/replay stand-in for OpenRouter, for benchmarking without a network.
+
+Recording: set ``LLM_RECORD_DIR`` and every successful chat completion that
+goes through the shared HTTP client (``backend.llm_client``) is saved there
+as one JSON fixture, together with how long the upstream took.
+
+Replaying: ``flask --app main fake-llm --fixtures DIR`` serves those fixtures
+from a local OpenAI-compatible endpoint. Point the app at it with
+``OPENROUTER_BASE_URL=http://127.0.0.1:8099/v1`` (any API key works). Latency,
+error rate and streaming speed are configurable, so route latency can be
+measured under realistic upstream behaviour.
+
+A request is matched to a fixture by its exact model + messages first, then
+by its "shape" (model and the first line of each message, which ignores the
+quiz content), then by any fixture for the same model. With no fixture at all
+the server answers with a short canned reply.
+"""
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+DEFAULT_PORT = 8099
+CANNED_REPLY = "OK"
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        # Multimodal messages: keep the text parts, images only by their hash
+        return " ".join(
+            part.get("text", "") if part.get("type") == "text" else _digest(part)[:16]
+            for part in content
+        )
+    return content or ""
+
+
+def request_key(body):
+    """Exact match: the model and the full conversation."""
+    return _digest({"model": body.get("model"), "messages": body.get("messages", [])})
+
+
+def request_shape(body):
+    """Loose match: the model and the first line of each message."""
+    lines = [
+        (m.get("role"), _message_text(m).split("\n", 1)[0][:120])
+        for m in body.get("messages", [])
+    ]
+    return _digest({"model": body.get("model"), "lines": lines})
+
+
+# ── Latency models ───────────────────────────────────────────────────
+
+def parse_latency(spec):
+    """Turn a latency spec into ``sample(recorded_ms) -> seconds``.
+
+    ``fixed:MS``, ``uniform:LO,HI``, ``normal:MEAN,SD``, ``lognormal:MEDIAN,SIGMA``
+    (milliseconds), or ``recorded[:SCALE]`` to reuse each fixture's own
+    measured latency. An empty spec means no delay.
+    """
+    kind, _, args = (spec or "fixed:0").partition(":")
+    params = [float(a) for a in args.split(",") if a.strip()]
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        ms = params[0] if params else 0.0
+        return lambda recorded: ms / 1000
+    if kind == "uniform":
+        lo, hi = params
+        return lambda recorded: random.uniform(lo, hi) / 1000
+    if kind == "normal":
+        mean, sd = params
+        return lambda recorded: max(0.0, random.gauss(mean, sd)) / 1000
+    if kind == "lognormal":
+        median, sigma = params
+        return lambda recorded: median * random.lognormvariate(0.0, sigma) / 1000
+    if kind == "recorded":
+        scale = params[0] if params else 1.0
+        return lambda recorded: (recorded or 0.0) * scale / 1000
+    raise ValueError(f"Unknown latency spec: {spec!r}")
+
+
+# ── Recording ────────────────────────────────────────────────────────
+
+def _completion_from_sse(raw):
+    """Rebuild a plain completion from a streamed (SSE) response body."""
+    parts, meta = [], {}
+    for line in raw.splitlines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        meta = meta or chunk
+        for choice in chunk.get("choices", []):
+            parts.append((choice.get("delta") or {}).get("content") or "")
+    return {
+        "id": meta.get("id", "recorded"),
+        "object": "chat.completion",
+        "created": meta.get("created", int(time.time())),
+        "model": meta.get("model", ""),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(parts)},
+            "finish_reason": "stop",
+        }],
+    }
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Wraps the real transport and saves successful chat completions as fixtures.
+
+    Streamed responses are read in full before they are handed back, so
+    recording trades away streaming for a complete fixture.
+    """
+
+    def __init__(self, transport, directory):
+        self.transport = transport
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def handle_request(self, request):
+        started = time.time()
+        response = self.transport.handle_request(request)
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return response
+
+        content = response.read()
+        latency_ms = round((time.time() - started) * 1000, 1)
+        if response.status_code == 200:
+            try:
+                self._save(json.loads(request.content), content, latency_ms)
+            except Exception as e:
+                print(f"[Replay] Could not record completion: {e}")
+        # The body is already decoded, so drop the headers that describe the wire format
+        headers = [(k, v) for k, v in response.headers.multi_items()
+                   if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def _save(self, body, content, latency_ms):
+        text = content.decode("utf-8")
+        completion = _completion_from_sse(text) if body.get("stream") else json.loads(text)
+        key = request_key(body)
+        fixture = {
+            "key": key,
+            "shape": request_shape(body),
+            "model": body.get("model"),
+            "request": body,
+            "latency_ms": latency_ms,
+            "response": completion,
+        }
+        path = os.path.join(self.directory, f"{key[:24]}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+        print(f"[Replay] Recorded {body.get('model')} completion ({latency_ms} ms) -> {path}")
+
+    def close(self):
+        self.transport.close()
+
+
+# ── Replaying ────────────────────────────────────────────────────────
+
+class FixtureStore:
+    """Recorded completions indexed by exact key, shape and model."""
+
+    def __init__(self, directory=None):
+        self.by_key, self.by_shape, self.by_model = {}, {}, {}
+        self._cycles = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        if directory:
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                with open(path, encoding="utf-8") as f:
+                    self.add(json.load(f))
+
+    def add(self, fixture):
+        self.count += 1
+        self.by_key[fixture["key"]] = fixture
+        self.by_shape.setdefault(fixture["shape"], []).append(fixture)
+        self.by_model.setdefault(fixture.get("model"), []).append(fixture)
+
+    def _next(self, bucket, fixtures):
+        # Rotate through candidates so repeated requests don't all get the same answer
+        with self._lock:
+            cycle = self._cycles.get(bucket)
+            if cycle is None:
+                cycle = self._cycles[bucket] = itertools.cycle(fixtures)
+            return next(cycle)
+
+    def lookup(self, body):
+        """Return ``(fixture, match)`` where match is exact/shape/model/none."""
+        fixture = self.by_key.get(request_key(body))
+        if fixture:
+            return fixture, "exact"
+        shape = request_shape(body)
+        if shape in self.by_shape:
+            return self._next(("shape", shape), self.by_shape[shape]), "shape"
+        model = body.get("model")
+        if model in self.by_model:
+            return self._next(("model", model), self.by_model[model]), "model"
+        return None, "none"
+
+
+class FakeLLMServer:
+    """Local OpenAI-compatible endpoint serving recorded completions.
+
+    ``latency`` is a :func:`parse_latency` spec for the time to the first
+    byte; ``error_rate`` is the share of requests answered with one of
+    ``error_statuses`` instead; streamed replies are sent in
+    ``chunk_chars``-sized pieces, ``chunk_delay_ms`` apart.
+    """
+
+    def __init__(self, fixtures=None, host="127.0.0.1", port=DEFAULT_PORT, latency=None,
+                 error_rate=0.0, error_statuses=(429, 500, 503), chunk_chars=24, chunk_delay_ms=20.0,
+                 seed=None):
+        self.store = fixtures if isinstance(fixtures, FixtureStore) else FixtureStore(fixtures)
+        self.latency = parse_latency(latency)
+        self.error_rate = float(error_rate)
+        self.error_statuses = tuple(error_statuses)
+        self.chunk_chars = max(1, int(chunk_chars))
+        self.chunk_delay = float(chunk_delay_ms) / 1000
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "exact": 0, "shape": 0, "model": 0, "none": 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve from a background thread (for benchmarks); returns self."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _count(self, *names):
+        with self._stats_lock:
+            for name in names:
+                self.stats[name] += 1
+
+    def reply_for(self, body):
+        """The completion to send for a request body, plus how it was matched."""
+        fixture, match = self.store.lookup(body)
+        if fixture:
+            completion = dict(fixture["response"])
+            recorded_ms = fixture.get("latency_ms")
+        else:
+            completion = {
+                "id": "fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": CANNED_REPLY},
+                    "finish_reason": "stop",
+                }],
+            }
+            recorded_ms = None
+        completion["model"] = body.get("model", completion.get("model", ""))
+        return completion, recorded_ms, match
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    models = sorted(m for m in server.store.by_model if m)
+                    return self._send_json(200, {"object": "list", "data": [
+                        {"id": m, "object": "model", "owned_by": "fake-llm"} for m in models
+                    ]})
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send_json(404, {"error": {"message": "Not found"}})
+                try:
+                    body = json.loads(raw or b"{}")
+                except ValueError:
+                    return self._send_json(400, {"error": {"message": "Invalid JSON"}})
+
+                completion, recorded_ms, match = server.reply_for(body)
+                time.sleep(server.latency(recorded_ms))
+
+                if server.error_rate and server.random.random() < server.error_rate:
+                    server._count("requests", "errors")
+                    status = server.random.choice(server.error_statuses)
+                    headers = {"Retry-After": "1"} if status == 429 else None
+                    return self._send_json(status, {"error": {"message": "Injected upstream error", "code": status}},
+                                           headers)
+
+                server._count("requests", match)
+                if body.get("stream"):
+                    return self._stream(completion)
+                self._send_json(200, completion)
+
+            def _stream(self, completion):
+                text = completion["choices"][0]["message"].get("content") or ""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                base = {"id": completion.get("id", "fake"), "object": "chat.completion.chunk",
+                        "created": completion.get("created", int(time.time())), "model": completion["model"]}
+                step = server.chunk_chars
+                pieces = [text[i:i + step] for i in range(0, len(text), step)]
+                try:
+                    for i, piece in enumerate(pieces):
+                        if i and server.chunk_delay:
+                            time.sleep(server.chunk_delay)
+                        chunk = {**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    done = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                    self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+        return Handler
@@ -0,0 +1,210 @@
+"""In-process metrics exported in the Prometheus text format at ``/metrics``.
+
+No client library is needed: counters and histograms live in memory per
+process and are rendered on scrape. Series:
+
+- ``http_request_duration_seconds`` — per endpoint, method and status
+- ``http_request_db_queries`` / ``http_request_db_seconds`` — SQL per request
+- ``db_queries_total`` / ``db_query_seconds_total`` — all SQL, request or background
+- ``llm_call_duration_seconds``, ``llm_retries_total``, ``llm_failures_total``,
+  ``llm_response_chars`` — per AIEngine method and model
+- ``extraction_duration_seconds`` — PDF and OCR text extraction
+
+Set ``METRICS_ENABLED=false`` to turn collection off, and ``METRICS_TOKEN``
+to require ``Authorization: Bearer <token>`` on the endpoint. On Vercel the
+app is public, so metrics stay off there until a token is set.
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                le = f'le="{bound if bound == "+Inf" else _format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+# ── Series ───────────────────────────────────────────────────────────
+
+HTTP_DURATION = Histogram("http_request_duration_seconds", "Time to produce a response.",
+                          ("endpoint", "method", "status"))
+HTTP_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements executed per request.",
+                            ("endpoint",), COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL per request.", ("endpoint",))
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.", ("context",))
+DB_SECONDS = Counter("db_query_seconds_total", "Time spent executing SQL.", ("context",))
+LLM_DURATION = Histogram("llm_call_duration_seconds", "AIEngine call time, retries included.",
+                         ("method", "model", "outcome"))
+LLM_RETRIES = Counter("llm_retries_total", "LLM attempts retried after a failure.", ("method", "model"))
+LLM_FAILURES = Counter("llm_failures_total", "LLM calls that failed after all attempts.", ("method", "model"))
+LLM_RESPONSE_CHARS = Histogram("llm_response_chars", "Characters of LLM output per call.",
+                               ("method", "model"), SIZE_BUCKETS)
+EXTRACTION_DURATION = Histogram("extraction_duration_seconds", "Text extraction time for uploads.", ("kind",))
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── Instrumentation helpers ──────────────────────────────────────────
+
+def timed(histogram, *label_values):
+    """Decorator: observe the wrapped function's run time."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *label_values)
+        return wrapper
+    return decorate
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    in_request = has_request_context() and "metrics_sql" in g
+    if in_request:
+        g.metrics_sql[0] += 1
+        g.metrics_sql[1] += elapsed
+    context_label = "request" if in_request else "background"
+    DB_QUERIES.inc(context_label)
+    DB_SECONDS.inc(context_label, amount=elapsed)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_query_start"):
+        conn.info["metrics_query_start"].pop()
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = [0, 0.0]
+
+
+def _finish_request(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        HTTP_DURATION.observe(time.perf_counter() - started, endpoint, request.method, str(response.status_code))
+        queries, seconds = g.metrics_sql
+        HTTP_DB_QUERIES.observe(queries, endpoint)
+        HTTP_DB_SECONDS.observe(seconds, endpoint)
+    return response
+
+
+def _metrics_view():
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """Hook request timing and SQL events into ``app`` and serve ``/metrics``."""
+    if not ENABLED:
+        return
+    if os.environ.get("VERCEL") and not os.getenv("METRICS_TOKEN"):
+        print("[Metrics] /metrics is off on Vercel until METRICS_TOKEN is set")
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.add_url_rule("/metrics", "metrics", _metrics_view)
@@ -0,0 +1,167 @@
+"""Versioned schema migrations for SQLite and PostgreSQL.
+
+``db.create_all()`` only creates missing tables; it never alters existing
+ones. Changes to existing tables are registered here with ``@migration``
+and applied in order at startup. The applied version is recorded in a
+``schema_version`` table.
+
+Every migration must be idempotent. A fresh database already gets the
+latest tables (and their declared indexes) from ``create_all()``, and
+then runs every migration as well.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register ``fn(conn)`` as schema version ``version``."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# ── Helpers ──────────────────────────────────────────────────────────
+
+def has_column(conn, table, column):
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn, table, column, ddl_type):
+    """ALTER TABLE ... ADD COLUMN, skipped if the column already exists."""
+    if not has_column(conn, table, column):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl_type}'))
+
+
+def create_index(conn, name, table, columns, unique=False):
+    """CREATE INDEX IF NOT EXISTS (supported by SQLite and PostgreSQL 9.5+)."""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    conn.execute(text(f'CREATE {kind} IF NOT EXISTS "{name}" ON "{table}" ({cols})'))
+
+
+# ── Runner ───────────────────────────────────────────────────────────
+
+def current_version(conn):
+    if "schema_version" not in inspect(conn).get_table_names():
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(engine):
+    """Apply pending migrations, each in its own transaction."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            " version INTEGER PRIMARY KEY,"
+            " description VARCHAR(200) NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = current_version(conn)
+
+    for version, description, fn in MIGRATIONS:
+        if version <= applied:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+        print(f"[Migrations] Applied {version}: {description}")
+        applied = version
+    return applied
+
+
+# ── Migrations ───────────────────────────────────────────────────────
+
+@migration(1, "question pool key")
+def _question_pool_key(conn):
+    add_column(conn, "question", "topic_key", "VARCHAR(200)")
+    create_index(conn, "ix_question_pool", "question", ["topic_key", "difficulty", "q_type"])
+
+
+@migration(2, "indexes for per-user hot queries")
+def _hot_path_indexes(conn):
+    create_index(conn, "ix_quiz_result_user_ts", "quiz_result", ["user_id", "timestamp"])
+    create_index(conn, "ix_topic_mastery_user_topic", "topic_mastery", ["user_id", "topic"])
+    create_index(conn, "ix_mistake_bank_user", "mistake_bank", ["user_id", "added_at"])
+
+
+@migration(3, "deduplicated, scheduled mistake bank")
+def _mistake_schedule(conn):
+    from backend.models import MistakeBank
+
+    add_column(conn, "mistake_bank", "content_hash", "VARCHAR(64)")
+    add_column(conn, "mistake_bank", "miss_count", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "mistake_bank", "due_at", "TIMESTAMP")
+    add_column(conn, "mistake_bank", "interval_days", "FLOAT NOT NULL DEFAULT 0")
+    add_column(conn, "mistake_bank", "ease", "FLOAT NOT NULL DEFAULT 2.5")
+    add_column(conn, "mistake_bank", "repetitions", "INTEGER NOT NULL DEFAULT 0")
+
+    # Fold repeated misses of the same question into the oldest row
+    groups = {}
+    rows = conn.execute(text(
+        "SELECT id, user_id, question_text, correct_answer FROM mistake_bank ORDER BY id"
+    ))
+    for row_id, user_id, question_text, correct_answer in rows:
+        key = (user_id, MistakeBank.hash_for(question_text, correct_answer))
+        groups.setdefault(key, []).append(row_id)
+    for (user_id, content_hash), ids in groups.items():
+        conn.execute(
+            text("UPDATE mistake_bank SET content_hash = :h, miss_count = :n,"
+                 " due_at = COALESCE(due_at, added_at) WHERE id = :id"),
+            {"h": content_hash, "n": len(ids), "id": ids[0]},
+        )
+        if len(ids) > 1:
+            conn.execute(text("DELETE FROM mistake_bank WHERE id = :id"), [{"id": i} for i in ids[1:]])
+    conn.execute(text(
+        "UPDATE user_stats SET mistake_count = ("
+        " SELECT COUNT(*) FROM mistake_bank WHERE mistake_bank.user_id = user_stats.user_id)"
+    ))
+
+    create_index(conn, "ix_mistake_bank_due", "mistake_bank", ["user_id", "due_at"])
+    create_index(conn, "ux_mistake_bank_hash", "mistake_bank", ["user_id", "content_hash"], unique=True)
+
+
+@migration(4, "question difficulty ratings")
+def _question_ratings(conn):
+    add_column(conn, "question", "rating", "FLOAT NOT NULL DEFAULT 1000")
+    add_column(conn, "question", "answered_count", "INTEGER NOT NULL DEFAULT 0")
+    conn.execute(text(
+        "UPDATE question SET rating = CASE difficulty"
+        " WHEN 'easy' THEN 800 WHEN 'hard' THEN 1200 ELSE 1000 END"
+        " WHERE answered_count = 0"
+    ))
+    create_index(conn, "ix_question_rating", "question", ["topic_key", "q_type", "rating"])
+
+
+@migration(5, "question near-duplicate fingerprints")
+def _question_fingerprints(conn):
+    from backend.dedupe import bands, question_fingerprint
+
+    add_column(conn, "question", "simhash", "BIGINT")
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, question_text, options_json FROM question"
+            " WHERE simhash IS NULL ORDER BY id LIMIT 1000"
+        )).fetchall()
+        if not rows:
+            break
+        fps = [(q_id, question_fingerprint(question_text, options_json))
+               for q_id, question_text, options_json in rows]
+        conn.execute(text("UPDATE question SET simhash = :fp WHERE id = :id"),
+                     [{"fp": fp, "id": q_id} for q_id, fp in fps])
+        conn.execute(
+            text("INSERT INTO question_band (band, value, question_id) VALUES (:band, :value, :q_id)"),
+            [{"band": band, "value": value, "q_id": q_id} for q_id, fp in fps for band, value in bands(fp)],
+        )
+
+
+@migration(6, "deferred quiz insights")
+def _quiz_insight(conn):
+    add_column(conn, "quiz_result", "insight", "TEXT")
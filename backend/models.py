@@ -1,8 +1,11 @@
 """Database models for AdaptiveQuiz."""
-from datetime import datetime, date
+import hashlib
+import json
+from datetime import datetime, timedelta
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import func, insert
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
@@ -35,7 +38,95 @@ class Question(db.Model):
     q_type = db.Column(db.String(20), default="mcq")
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
     topic = db.Column(db.String(200))
+    # Canonical topic for the shared question pool (NULL = not pooled)
+    topic_key = db.Column(db.String(200), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Elo difficulty estimate, refined by every answer (see backend.adaptive)
+    rating = db.Column(db.Float, default=1000.0, nullable=False)
+    answered_count = db.Column(db.Integer, default=0, nullable=False)
+    # 64-bit SimHash of the question text (see backend.dedupe)
+    simhash = db.Column(db.BigInteger, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_question_pool", "topic_key", "difficulty", "q_type"),
+        db.Index("ix_question_rating", "topic_key", "q_type", "rating"),
+    )
+
+    # Starting ratings for the difficulty the question was generated at
+    DIFFICULTY_RATINGS = {"easy": 800.0, "medium": 1000.0, "hard": 1200.0}
+
+    @staticmethod
+    def values_from_ai(q_data, difficulty, q_format, user_id=None, topic=None, topic_key=None):
+        """Column values for one question dict returned by AIEngine."""
+        return {
+            "question_text": q_data.get("question", ""),
+            "options_json": json.dumps(q_data.get("options", {})),
+            "correct_answer": q_data.get("correct_answer", ""),
+            "explanation": q_data.get("explanation", ""),
+            "difficulty": difficulty,
+            "q_type": q_format,
+            "user_id": user_id,
+            "topic": topic,
+            "topic_key": topic_key,
+            "rating": Question.DIFFICULTY_RATINGS.get(difficulty, 1000.0),
+        }
+
+    @classmethod
+    def from_ai(cls, q_data, difficulty, q_format, user_id=None, topic=None, topic_key=None):
+        """Build a row from one question dict returned by AIEngine."""
+        return cls(**cls.values_from_ai(q_data, difficulty, q_format, user_id, topic, topic_key))
+
+
+def bulk_insert_questions(rows):
+    """Insert many questions in one statement and return their ids in input order.
+
+    Uses batched multi-row INSERT ... RETURNING on PostgreSQL and SQLite
+    3.35+. Older SQLite builds have no RETURNING, so they fall back to one
+    flush per row. ``rows`` are dicts of column values with the same keys.
+    """
+    if not rows:
+        return []
+    dialect = db.session.get_bind().dialect
+    if getattr(dialect, "insert_executemany_returning_sort_by_parameter_order", False):
+        result = db.session.execute(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True), rows
+        )
+        return [row[0] for row in result]
+    ids = []
+    for values in rows:
+        question = Question(**values)
+        db.session.add(question)
+        db.session.flush()
+        ids.append(question.id)
+    return ids
+
+
+class QuestionBand(db.Model):
+    """One 16-bit band of a question's SimHash, for near-duplicate lookups."""
+    band = db.Column(db.SmallInteger, primary_key=True)
+    value = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), primary_key=True)
+
+
+class UserAbility(db.Model):
+    """A user's Elo ability on one canonical topic."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    topic_key = db.Column(db.String(200), primary_key=True)
+    rating = db.Column(db.Float, default=1000.0, nullable=False)
+    answered_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class QuestionSeen(db.Model):
+    """Pool questions a user has already been served."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey("question.id"), nullable=False)
+    seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "question_id", name="uq_question_seen"),
+    )
 
 
 class QuizResult(db.Model):
@@ -46,6 +137,12 @@ class QuizResult(db.Model):
     topic = db.Column(db.String(200))
     difficulty = db.Column(db.String(20))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # AI feedback on the missed questions, filled in by a background job
+    insight = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_quiz_result_user_ts", "user_id", "timestamp"),
+    )
 
 
 class TopicMastery(db.Model):
@@ -55,6 +152,10 @@ class TopicMastery(db.Model):
     correct_count = db.Column(db.Integer, default=0)
     total_count = db.Column(db.Integer, default=0)
 
+    __table_args__ = (
+        db.Index("ix_topic_mastery_user_topic", "user_id", "topic"),
+    )
+
     @property
     def percentage(self):
         if self.total_count == 0:
@@ -71,3 +172,220 @@ class MistakeBank(db.Model):
     topic = db.Column(db.String(200))
     explanation = db.Column(db.Text)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # One row per distinct missed question, scheduled for review with SM-2
+    content_hash = db.Column(db.String(64))
+    miss_count = db.Column(db.Integer, default=1, nullable=False)
+    due_at = db.Column(db.DateTime, default=datetime.utcnow)
+    interval_days = db.Column(db.Float, default=0.0, nullable=False)
+    ease = db.Column(db.Float, default=2.5, nullable=False)
+    repetitions = db.Column(db.Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_mistake_bank_user", "user_id", "added_at"),
+        db.Index("ix_mistake_bank_due", "user_id", "due_at"),
+        db.Index("ux_mistake_bank_hash", "user_id", "content_hash", unique=True),
+    )
+
+    MIN_EASE = 1.3
+
+    @staticmethod
+    def hash_for(question_text, correct_answer):
+        """Identify a mistake by its question and answer, ignoring case and spacing."""
+        normalized = " ".join(f"{question_text}\n{correct_answer}".lower().split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def review(self, quality, now=None):
+        """Reschedule after an answer graded 0-5 (SM-2); below 3 counts as a lapse."""
+        now = now or datetime.utcnow()
+        if quality < 3:
+            self.repetitions = 0
+            self.interval_days = 1.0
+        else:
+            self.repetitions = (self.repetitions or 0) + 1
+            if self.repetitions == 1:
+                self.interval_days = 1.0
+            elif self.repetitions == 2:
+                self.interval_days = 6.0
+            else:
+                self.interval_days = round(self.interval_days * self.ease, 1)
+        self.ease = max(self.MIN_EASE, self.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        self.due_at = now + timedelta(days=self.interval_days)
+
+
+class Document(db.Model):
+    """Cleaned text extracted from an uploaded PDF or image, keyed by the upload's SHA-256."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    filename = db.Column(db.String(255))
+    size_bytes = db.Column(db.Integer)
+    page_count = db.Column(db.Integer)
+    topic = db.Column(db.String(200))
+    text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_document_sha256", "sha256"),
+        db.Index("ux_document_user_sha256", "user_id", "sha256", unique=True),
+        db.Index("ix_document_user_used", "user_id", "last_used_at"),
+    )
+
+    @property
+    def label(self):
+        """Quiz topic label, matching what a fresh upload of the file is tracked under."""
+        prefix = "PDF" if self.kind == "pdf" else "Image"
+        return f"{prefix}: {self.filename}"
+
+
+class StudySet(db.Model):
+    """Study Hub output for one piece of content, shared by everyone who submits it."""
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)
+    title = db.Column(db.String(200))
+    source_type = db.Column(db.String(20))
+    content = db.Column(db.Text, nullable=False)
+    eli10 = db.Column(db.Text)
+    mnemonic_story = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class StudyNote(db.Model):
+    """A shorthand note or key concept of a study set, in display order."""
+    study_set_id = db.Column(db.Integer, db.ForeignKey("study_set.id"), primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)  # "note" or "concept"
+    position = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+
+
+class Flashcard(db.Model):
+    study_set_id = db.Column(db.Integer, db.ForeignKey("study_set.id"), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    front = db.Column(db.Text, nullable=False)
+    back = db.Column(db.Text)
+
+
+class UserStudySet(db.Model):
+    """A study set in a user's library."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    study_set_id = db.Column(db.Integer, db.ForeignKey("study_set.id"), primary_key=True)
+    opened_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_user_study_set_opened", "user_id", "opened_at"),
+    )
+
+
+class UserStats(db.Model):
+    """Per-user totals, kept current as quizzes and mistakes are saved."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    quiz_count = db.Column(db.Integer, default=0, nullable=False)
+    correct_total = db.Column(db.Integer, default=0, nullable=False)
+    question_total = db.Column(db.Integer, default=0, nullable=False)
+    mistake_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def compute(cls, user_id):
+        """Recompute the rollup from the source tables (used for backfill)."""
+        quiz_count, correct_total, question_total = db.session.query(
+            func.count(QuizResult.id),
+            func.coalesce(func.sum(QuizResult.score), 0),
+            func.coalesce(func.sum(QuizResult.total_questions), 0),
+        ).filter(QuizResult.user_id == user_id).one()
+        mistake_count = db.session.query(func.count(MistakeBank.id)).filter(
+            MistakeBank.user_id == user_id
+        ).scalar()
+        return cls(
+            user_id=user_id,
+            quiz_count=quiz_count,
+            correct_total=int(correct_total),
+            question_total=int(question_total),
+            mistake_count=mistake_count,
+        )
+
+
+def insert_or_add(model, values, increments):
+    """Insert a counter row, or add ``increments`` to it if another request created it first.
+
+    One ``INSERT ... ON CONFLICT (primary key) DO UPDATE`` on PostgreSQL and
+    SQLite, so two concurrent first writes both count. Other databases get
+    a plain insert.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        db.session.add(model(**values))
+        return
+    db.session.execute(upsert(model).values(**values).on_conflict_do_update(
+        index_elements=[column.name for column in model.__table__.primary_key],
+        set_={name: getattr(model, name) + delta for name, delta in increments.items()},
+    ))
+
+
+def bump_user_stats(user_id, **deltas):
+    """Apply counter deltas to a user's rollup within the current transaction.
+
+    Uses an atomic ``UPDATE ... SET x = x + n``. If the user has no rollup
+    yet, it is computed from scratch instead (after autoflush, so the
+    caller's pending rows are already counted); a rollup created meanwhile
+    by a concurrent request just gets the deltas.
+    """
+    updated = UserStats.query.filter_by(user_id=user_id).update(
+        {getattr(UserStats, name): getattr(UserStats, name) + delta for name, delta in deltas.items()},
+        synchronize_session=False,
+    )
+    if not updated:
+        stats = UserStats.compute(user_id)
+        insert_or_add(UserStats, {
+            "user_id": user_id,
+            "quiz_count": stats.quiz_count,
+            "correct_total": stats.correct_total,
+            "question_total": stats.question_total,
+            "mistake_count": stats.mistake_count,
+        }, deltas)
+
+
+class AccuracyRollup(db.Model):
+    """Per-user quiz accuracy bucketed by day, week (Monday) and month."""
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    resolution = db.Column(db.String(10), primary_key=True)  # day | week | month
+    bucket = db.Column(db.Date, primary_key=True)
+    quiz_count = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+    total = db.Column(db.Integer, default=0, nullable=False)
+
+    RESOLUTIONS = ("day", "week", "month")
+
+    @property
+    def accuracy(self):
+        return int(self.correct / self.total * 100) if self.total else 0
+
+    @staticmethod
+    def bucket_for(resolution, day):
+        if resolution == "week":
+            return day - timedelta(days=day.weekday())
+        if resolution == "month":
+            return day.replace(day=1)
+        return day
+
+
+def record_accuracy(user_id, when, score, total):
+    """Add one quiz result to the user's day/week/month rollups (current transaction)."""
+    for resolution in AccuracyRollup.RESOLUTIONS:
+        bucket = AccuracyRollup.bucket_for(resolution, when.date())
+        increments = {"quiz_count": 1, "correct": score, "total": total}
+        updated = AccuracyRollup.query.filter_by(
+            user_id=user_id, resolution=resolution, bucket=bucket
+        ).update({
+            getattr(AccuracyRollup, name): getattr(AccuracyRollup, name) + delta
+            for name, delta in increments.items()
+        }, synchronize_session=False)
+        if not updated:
+            insert_or_add(AccuracyRollup, {"user_id": user_id, "resolution": resolution,
+                                           "bucket": bucket, **increments}, increments)
@@ -0,0 +1,10 @@
+"""PDF process-pool task — kept free of app imports so spawned workers load only pypdf."""
+import io
+
+import pypdf
+
+
+def extract_page_range(data, start, stop):
+    """Parse the PDF bytes and return the text of pages [start, stop)."""
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
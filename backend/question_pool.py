@@ -0,0 +1,99 @@
+"""Warm question pool for topic quizzes, keyed by (topic, difficulty, format)."""
+import os
+import threading
+import time
+
+from flask import session
+from flask_login import current_user
+from sqlalchemy import exists, func
+
+from backend.dedupe import store_questions
+from backend.models import Question, QuestionSeen, db
+from backend.services import canonical_topic
+
+POOL_LOW_WATERMARK = int(os.getenv("POOL_LOW_WATERMARK", 30))
+POOL_REFILL_BATCH = int(os.getenv("POOL_REFILL_BATCH", 10))
+POOL_REFILL_INTERVAL = float(os.getenv("POOL_REFILL_INTERVAL", 60))
+GUEST_SEEN_LIMIT = 200
+
+_refill_lock = threading.Lock()
+_last_refill_check = {}
+
+
+def draw(topic_name, difficulty, q_format, count):
+    """Pick ``count`` pooled questions the current player hasn't seen, in one query.
+
+    Returns an empty list unless the pool can fill the whole quiz.
+    """
+    topic_key = canonical_topic(topic_name)
+    if not topic_key:
+        return []
+    query = Question.query.filter_by(topic_key=topic_key, difficulty=difficulty, q_type=q_format)
+    if current_user.is_authenticated:
+        query = query.filter(~exists().where(
+            QuestionSeen.user_id == current_user.id,
+            QuestionSeen.question_id == Question.id,
+        ))
+    elif session.get("seen_pool"):
+        query = query.filter(Question.id.notin_(session["seen_pool"]))
+    questions = query.order_by(func.random()).limit(count).all()
+    return questions if len(questions) == count else []
+
+
+def mark_seen(q_ids):
+    """Remember that the current player has been served these questions."""
+    if not q_ids:
+        return
+    if current_user.is_authenticated:
+        db.session.add_all([QuestionSeen(user_id=current_user.id, question_id=q_id) for q_id in q_ids])
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[Pool] Could not record seen questions: {e}")
+    else:
+        seen = session.get("seen_pool", []) + list(q_ids)
+        session["seen_pool"] = seen[-GUEST_SEEN_LIMIT:]
+
+
+def request_refill(topic_name, difficulty, q_format):
+    """Queue a background top-up for this pool, at most once per interval."""
+    from backend.jobs import job_queue, QueueFull
+
+    if job_queue.inline:
+        # A synchronous refill would make the pool hit as slow as a miss;
+        # inline deployments grow the pool from regular generations instead
+        return
+    key = (canonical_topic(topic_name), difficulty, q_format)
+    now = time.time()
+    with _refill_lock:
+        if now - _last_refill_check.get(key, 0) < POOL_REFILL_INTERVAL:
+            return
+        _last_refill_check[key] = now
+    try:
+        job_queue.submit("pool-refill", refill, topic_name, difficulty, q_format, owner="system")
+    except QueueFull:
+        with _refill_lock:
+            _last_refill_check.pop(key, None)
+
+
+def refill(job_id, topic_name, difficulty, q_format):
+    """Job: generate a batch of fresh questions if the pool is below its watermark."""
+    from backend.routes import ai
+
+    topic_key = canonical_topic(topic_name)
+    size = Question.query.filter_by(topic_key=topic_key, difficulty=difficulty, q_type=q_format).count()
+    if size >= POOL_LOW_WATERMARK:
+        return {"topic_key": topic_key, "pool_size": size, "added": 0}
+
+    content = f"Generate questions about: {topic_name}"
+    questions = ai.generate_questions(content, POOL_REFILL_BATCH, q_format, difficulty, use_cache=False)
+    store_questions([
+        Question.values_from_ai(q_data, difficulty, q_format, topic=topic_name, topic_key=topic_key)
+        for q_data in questions
+    ])
+    db.session.commit()
+    # Near-duplicates of stored questions are linked, not added
+    added = Question.query.filter_by(topic_key=topic_key, difficulty=difficulty, q_type=q_format).count() - size
+    print(f"[Pool] Refilled '{topic_key}' ({difficulty}/{q_format}) with {added} questions")
+    return {"topic_key": topic_key, "pool_size": size + added, "added": added}
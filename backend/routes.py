@@ -1,20 +1,32 @@
 """Flask routes for AdaptiveQuiz — all application endpoints."""
+import io
 import json
 import os
+import uuid
 from datetime import datetime, timedelta, date
 
 from flask import (
     Blueprint, render_template, request, redirect,
-    url_for, flash, session, jsonify,
+    url_for, flash, session, jsonify, Response, stream_with_context,
 )
 from flask_login import login_user, logout_user, login_required, current_user
 from sqlalchemy import or_
 
-from sqlalchemy.exc import OperationalError, DisconnectionError
+from sqlalchemy.exc import OperationalError, DisconnectionError, IntegrityError
+from werkzeug.datastructures import FileStorage
 
-from backend.models import User, Question, QuizResult, TopicMastery, MistakeBank, db
+from backend.models import (
+    User, Question, QuizResult, TopicMastery, MistakeBank, UserStats, AccuracyRollup, Document, StudySet, db,
+    bump_user_stats, record_accuracy, bulk_insert_questions,
+)
 from backend.ai_engine import AIEngine
-from backend.services import extract_text_from_pdf, extract_text_from_image, clean_text, generate_otp, send_otp_email
+from backend.health import HealthProber
+from backend.jobs import job_queue, QueueFull
+from backend.services import (
+    clean_text, canonical_topic,
+    generate_otp, send_otp_email,
+)
+from backend import adaptive, dedupe, documents, question_pool, study
 
 routes_bp = Blueprint("routes", __name__)
 
@@ -35,6 +47,7 @@ def safe_commit(max_retries=2):
 
 # Initialize AI engine (lazy — key resolved at first use)
 ai = AIEngine()
+health = HealthProber(ai.ping)
 
 
 def is_allowed():
@@ -48,39 +61,44 @@ def is_allowed():
 
 @routes_bp.route("/health")
 def health_check():
+    """Liveness check for load balancers — answered from memory, never calls the LLM."""
+    health.ensure_started()
     key = os.getenv("OPENROUTER_API_KEY", "")
-    api_test_result = "Not run"
-    api_error = None
-    if ai.client:
-        try:
-            test_completion = ai.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are an expert academic examiner. Output ONLY valid JSON. Structure: {\"questions\": [{\"question\": \"...\", \"options\": {\"A\": \"...\", \"B\": \"...\", \"C\": \"...\", \"D\": \"...\"}, \"correct_answer\": \"A\", \"explanation\": \"...\"}]}"},
-                    {"role": "user", "content": "TASK: Generate exactly 1 MCQ question.\nDIFFICULTY: medium — focus on application and analysis level.\nRULE: Generate MCQs with 4 options (A, B, C, D).\nCONTENT:\nScience trivia."}
-                ],
-                model=ai.MODEL,
-                response_format={"type": "json_object"},
-                temperature=0.3,
-                max_tokens=500,
-                timeout=20.0,
-            )
-            api_test_result = "Success"
-        except Exception as e:
-            api_test_result = "Failed"
-            api_error = str(e)
-    else:
-        api_test_result = "Client not initialized"
-
+    last = health.history[-1] if health.history else None
     return jsonify({
         "status": "ok",
         "openrouter_key_set": bool(key),
         "openrouter_key_preview": f"...{key[-6:]}" if len(key) > 6 else "NOT SET",
         "ai_client_ready": ai.client is not None,
-        "api_test_result": api_test_result,
-        "api_error": api_error,
+        "api_test_result": "Not run" if last is None else ("Success" if last["ok"] else "Failed"),
+        "api_error": last["error"] if last else None,
+        **health.status(),
+        "llm_requests": ai.request_stats(),
     })
 
 
+@routes_bp.route("/health/deep")
+def health_deep():
+    """Probe the LLM now (rate-limited) and report the probe history with p50/p95."""
+    health.ensure_started()
+    entry, wait = health.probe_on_demand()
+    cached = entry is None
+    if cached:
+        # Probed too recently: answer from the latest probe rather than fail the check
+        entry = health.history[-1] if health.history else {"ok": True}
+    response = jsonify({
+        "status": "ok" if entry["ok"] else "degraded",
+        "cached": cached,
+        **health.report(),
+        "llm_requests": ai.request_stats(),
+        "llm_cache": ai.cache.stats(),
+    })
+    if cached:
+        response.headers["X-Cached"] = "true"
+        response.headers["Retry-After"] = str(int(wait) + 1)
+    return response, 200 if entry["ok"] else 503
+
+
 # ═══════════════════════════════════════════════════════════════════
 # LANDING & AUTH
 # ═══════════════════════════════════════════════════════════════════
@@ -250,15 +268,21 @@ def dashboard():
     correct_total = 0
     total_q = 0
     mistake_count = 0
+    total_quizzes = 0
     user_streak = 0
     mastery_data = []
 
     if not is_guest and current_user.is_authenticated:
         username = current_user.username
-        results_list = QuizResult.query.filter_by(user_id=current_user.id).all()
-        correct_total = sum(r.score for r in results_list)
-        total_q = sum(r.total_questions for r in results_list)
-        mistake_count = MistakeBank.query.filter_by(user_id=current_user.id).count()
+        stats = db.session.get(UserStats, current_user.id)
+        if stats is None:
+            stats = UserStats.compute(current_user.id)
+            db.session.add(stats)
+            safe_commit()
+        correct_total = stats.correct_total
+        total_q = stats.question_total
+        mistake_count = stats.mistake_count
+        total_quizzes = stats.quiz_count
         user_streak = current_user.streak or 0
         mastery_data = TopicMastery.query.filter_by(user_id=current_user.id).all()
 
@@ -274,8 +298,7 @@ def dashboard():
         streak=user_streak,
         fun_fact=fun_fact,
         topic_mastery=mastery_data,
-        total_quizzes=len(QuizResult.query.filter_by(
-            user_id=current_user.id).all()) if not is_guest and current_user.is_authenticated else 0,
+        total_quizzes=total_quizzes,
     )
 
 
@@ -283,6 +306,146 @@ def dashboard():
 # QUIZ GENERATION & PLAY
 # ═══════════════════════════════════════════════════════════════════
 
+class GenerationError(Exception):
+    """A generation failure whose message is safe to show to the user."""
+
+
+def _job_owner():
+    """Identify who may poll a job: the logged-in user or this guest session."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    if "guest_token" not in session:
+        session["guest_token"] = uuid.uuid4().hex
+    return f"guest:{session['guest_token']}"
+
+
+def _buffer_upload(f):
+    """Copy an upload into memory so a worker can read it after the request ends."""
+    if not f or not f.filename:
+        return None
+    return FileStorage(stream=io.BytesIO(f.read()), filename=f.filename, content_type=f.content_type)
+
+
+def run_generation_job(job_id, *args, **kwargs):
+    """Job entry point; every failure is turned into a user-facing message."""
+    try:
+        return generate_quiz(job_id, *args, **kwargs)
+    except GenerationError:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        print(f"Generation error: {e}")
+        raise GenerationError(f"Error generating quiz: {str(e)}") from e
+
+
+def detect_document_topic(job_id, document_id):
+    """Job: label a newly stored document with its detected topic."""
+    document = db.session.get(Document, document_id)
+    if document is not None and not document.topic:
+        document.topic = ai.detect_topic(document.text)[:200]
+        db.session.commit()
+    return {"document_id": document_id}
+
+
+def _queue_topic_detection(document):
+    if document is None or document.topic or not ai.client:
+        return
+    if job_queue.inline:
+        # An inline job would hold the quiz for another LLM call; inline
+        # deployments label documents by filename instead
+        return
+    try:
+        job_queue.submit("document-topic", detect_document_topic, document.id)
+    except QueueFull:
+        pass
+
+
+def generate_quiz(job_id, source_type, count, q_format, difficulty, user_id,
+                  raw_text="", topic_name="", upload=None, stream=False,
+                  upload_sha256=None, filename=None, document_id=None, seen_ids=()):
+    """Worker pipeline: extract content → generate questions → insert rows.
+
+    ``seen_ids`` is a guest's ``seen_pool``; new questions are never linked
+    to ones the player has already been served.
+    """
+    content = ""
+    mastery_label = "General"
+    document = None
+    if source_type in ("pdf", "image") and upload_sha256:
+        # Text is extracted once per distinct file and reused on re-upload
+        document = documents.load(source_type, user_id, upload_sha256, upload, filename)
+        safe_commit()
+    elif source_type == "document" and document_id:
+        document = db.session.get(Document, document_id)
+
+    if document is not None:
+        content = document.text
+        mastery_label = document.label
+    elif source_type == "text":
+        content = raw_text
+        mastery_label = "Custom Text"
+    elif source_type == "topic":
+        mastery_label = topic_name or "General"
+        content = f"Generate questions about: {mastery_label}"
+
+    content = clean_text(content, keep_paragraphs=True)
+    if not content:
+        raise GenerationError("No content to generate questions from!")
+
+    # Topic quizzes feed the shared pool; they only reach the LLM when the
+    # pool is exhausted for this player, so a cached copy would be stale
+    topic_key = canonical_topic(mastery_label) if source_type == "topic" else None
+    use_cache = topic_key is None
+    summary = {"topic": mastery_label, "difficulty": difficulty, "expected": count,
+               "pooled": topic_key is not None}
+    q_ids = []
+    if stream:
+        # Persist and publish each question as soon as the model finishes it
+        recent = []
+        for q_data in ai.stream_questions(content, count, q_format, difficulty, use_cache=use_cache):
+            values = Question.values_from_ai(q_data, difficulty, q_format, user_id, mastery_label, topic_key)
+            q_id = dedupe.store_questions([values], recent, seen_by=user_id, seen_ids=seen_ids)[0]
+            safe_commit()
+            if q_id not in q_ids:
+                q_ids.append(q_id)
+                job_queue.update(job_id, result={**summary, "question_ids": q_ids, "streaming": True})
+    else:
+        questions = ai.generate_questions(content, count, q_format, difficulty, use_cache=use_cache)
+        q_ids = dedupe.unique_ids(dedupe.store_questions([
+            Question.values_from_ai(q_data, difficulty, q_format, user_id, mastery_label, topic_key)
+            for q_data in questions
+        ], seen_by=user_id, seen_ids=seen_ids))
+        safe_commit()
+
+    if not q_ids:
+        raise GenerationError("AI couldn't generate questions. Try different content or check your API key.")
+    _queue_topic_detection(document)
+    return {**summary, "question_ids": q_ids}
+
+
+def start_quiz(q_ids, topic, difficulty, job_id=None):
+    """Reset the session's quiz state for a new set of questions.
+
+    ``job_id`` marks a quiz whose questions are still being streamed in.
+    """
+    for key in ("quiz_job", "saved_result_id", "insight_job", "insight_pending"):
+        session.pop(key, None)
+    if job_id:
+        session["quiz_job"] = job_id
+    session.update({
+        "active_questions": q_ids,
+        "current_idx": 0,
+        "score": 0,
+        "quiz_topic": topic,
+        "quiz_difficulty": difficulty,
+        "user_answers": [],
+    })
+
+
+def wants_json():
+    return request.accept_mimetypes.best == "application/json"
+
+
 @routes_bp.route("/generate", methods=["POST", "GET"])
 def handle_generation():
     if not is_allowed():
@@ -292,98 +455,117 @@ def handle_generation():
     count = int(request.form.get("count", 5))
     q_format = request.form.get("q_format", "mcq")
     difficulty = request.form.get("difficulty", "medium")
-    mastery_label = "General"
     q_ids = []
 
     try:
-        content = ""
         if source_type == "mistake":
             # Re-quiz from mistake bank
             if session.get("is_guest"):
                 flash("Guest users don't have a Mistake Bank!", "warning")
                 return redirect(url_for("routes.dashboard"))
-            mistakes = MistakeBank.query.filter_by(user_id=current_user.id).limit(count).all()
+            # Only mistakes the review schedule says are due
+            mistakes = MistakeBank.query.filter_by(user_id=current_user.id) \
+                .filter(MistakeBank.due_at <= datetime.utcnow()) \
+                .order_by(MistakeBank.due_at.asc()).limit(count).all()
             if not mistakes:
+                if MistakeBank.query.filter_by(user_id=current_user.id).first():
+                    flash("Nothing is due for review yet. Come back later! ⏳", "info")
+                    return redirect(url_for("routes.review_mistakes"))
                 flash("Your Mistake Bank is empty! 🎉", "info")
                 return redirect(url_for("routes.dashboard"))
-            for m in mistakes:
-                new_q = Question(
-                    question_text=m.question_text,
-                    options_json=m.options_json,
-                    correct_answer=m.correct_answer,
-                    explanation=m.explanation,
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    topic=m.topic,
-                )
-                db.session.add(new_q)
-                db.session.flush()
-                q_ids.append(new_q.id)
+            q_ids = bulk_insert_questions([{
+                "question_text": m.question_text,
+                "options_json": m.options_json,
+                "correct_answer": m.correct_answer,
+                "explanation": m.explanation,
+                "user_id": current_user.id,
+                "topic": m.topic,
+            } for m in mistakes])
             safe_commit()
-            mastery_label = "Mistake Review"
-        else:
-            if source_type == "pdf":
-                f = request.files.get("pdf_file")
-                if f and f.filename:
-                    content = extract_text_from_pdf(f)
-                    mastery_label = f"PDF: {f.filename}"
-            elif source_type == "text":
-                content = request.form.get("raw_text", "")
-                mastery_label = "Custom Text"
-            elif source_type == "topic":
-                mastery_label = request.form.get("topic_name", "General")
-                content = f"Generate questions about: {mastery_label}"
-            elif source_type == "image":
-                f = request.files.get("image_file")
-                if f and f.filename:
-                    content = extract_text_from_image(f)
-                    mastery_label = f"Image: {f.filename}"
-
-            content = clean_text(content)
-            if not content:
-                flash("No content to generate questions from!", "danger")
-                return redirect(url_for("routes.dashboard"))
-
-            # Check API key before attempting generation
-            if not ai.client:
-                flash("OPENROUTER_API_KEY is not configured. Please add your API key to the .env file.", "danger")
-                return redirect(url_for("routes.dashboard"))
 
-            questions = ai.generate_questions(content, count, q_format, difficulty)
-            if not questions:
-                flash("AI couldn't generate questions. Try different content or check your API key.", "danger")
+            if not q_ids:
+                flash("No questions generated.", "warning")
                 return redirect(url_for("routes.dashboard"))
+            start_quiz(q_ids, "Mistake Review", difficulty)
+            return redirect(url_for("routes.quiz_page", q_id=q_ids[0]))
+
+        if difficulty == "adaptive":
+            # Serve from the bank at the player's level; otherwise generate at the nearest level
+            topic_key = canonical_topic(request.form.get("topic_name", "")) if source_type == "topic" else None
+            rating = adaptive.ability(topic_key)
+            if topic_key:
+                picked = adaptive.select(topic_key, q_format, rating, count)
+                if picked:
+                    q_ids = [q.id for q in picked]
+                    question_pool.mark_seen(q_ids)
+                    start_quiz(q_ids, request.form.get("topic_name", "General"), "adaptive")
+                    return redirect(url_for("routes.quiz_page", q_id=q_ids[0]))
+            difficulty = adaptive.difficulty_for(rating)
 
-            for q_data in questions:
-                new_q = Question(
-                    question_text=q_data.get("question", ""),
-                    options_json=json.dumps(q_data.get("options", {})),
-                    correct_answer=q_data.get("correct_answer", ""),
-                    explanation=q_data.get("explanation", ""),
-                    difficulty=difficulty,
-                    q_type=q_format,
-                    user_id=current_user.id if current_user.is_authenticated else None,
-                    topic=mastery_label,
-                )
-                db.session.add(new_q)
-                db.session.flush()
-                q_ids.append(new_q.id)
-            safe_commit()
-
-        if not q_ids:
-            flash("No questions generated.", "warning")
+        if source_type == "topic":
+            # Popular topics are served straight from the warm pool
+            topic_name = request.form.get("topic_name", "General")
+            pooled = question_pool.draw(topic_name, difficulty, q_format, count)
+            if pooled:
+                q_ids = [q.id for q in pooled]
+                question_pool.mark_seen(q_ids)
+                question_pool.request_refill(topic_name, difficulty, q_format)
+                start_quiz(q_ids, topic_name, difficulty)
+                return redirect(url_for("routes.quiz_page", q_id=q_ids[0]))
+
+        # Check API key before queueing generation
+        if not ai.client:
+            flash("OPENROUTER_API_KEY is not configured. Please add your API key to the .env file.", "danger")
             return redirect(url_for("routes.dashboard"))
 
-        # Store quiz session
-        session.update({
-            "active_questions": q_ids,
-            "current_idx": 0,
-            "score": 0,
-            "quiz_topic": mastery_label,
-            "quiz_difficulty": difficulty,
-            "user_answers": [],
-        })
-        return redirect(url_for("routes.quiz_page", q_id=q_ids[0]))
-
+        upload = upload_sha256 = filename = document_id = None
+        if source_type in ("pdf", "image"):
+            f = request.files.get("pdf_file" if source_type == "pdf" else "image_file")
+            if f and f.filename:
+                filename = f.filename
+                upload_sha256 = documents.digest(f)
+                # Files seen before are served from the document store; skip the copy
+                if documents.find(upload_sha256) is None:
+                    upload = _buffer_upload(f)
+        elif source_type == "document":
+            user_id = current_user.id if current_user.is_authenticated else None
+            document = documents.owned(request.form.get("document_id", type=int), user_id)
+            if document is None:
+                flash("That document is no longer in your library.", "warning")
+                return redirect(url_for("routes.library"))
+            document_id = document.id
+
+        job_id = job_queue.submit(
+            "generate", run_generation_job,
+            source_type, count, q_format, difficulty,
+            current_user.id if current_user.is_authenticated else None,
+            raw_text=request.form.get("raw_text", ""),
+            topic_name=request.form.get("topic_name", "General"),
+            upload=upload,
+            stream=request.form.get("stream") == "1",
+            upload_sha256=upload_sha256,
+            filename=filename,
+            document_id=document_id,
+            seen_ids=[] if current_user.is_authenticated else session.get("seen_pool", []),
+            owner=_job_owner(),
+        )
+        session["pending_job"] = job_id
+
+        if job_queue.inline:
+            # The job already ran in this request; go straight to the quiz
+            payload = _generation_progress(job_id, job_queue.get(job_id))
+            if wants_json():
+                return jsonify(payload)
+            return redirect(payload["redirect"])
+
+        status_url = url_for("routes.generation_status", job_id=job_id)
+        if wants_json():
+            return jsonify({"job_id": job_id, "status_url": status_url}), 202
+        return redirect(url_for("routes.generation_wait", job_id=job_id))
+
+    except QueueFull as e:
+        flash(str(e), "warning")
+        return redirect(url_for("routes.dashboard"))
     except Exception as e:
         db.session.rollback()
         print(f"Generation error: {e}")
@@ -391,6 +573,152 @@ def handle_generation():
         return redirect(url_for("routes.dashboard"))
 
 
+@routes_bp.route("/generate/wait/<job_id>")
+def generation_wait(job_id):
+    if not is_allowed():
+        return redirect(url_for("routes.login"))
+    return render_template(
+        "generating.html",
+        status_url=url_for("routes.generation_status", job_id=job_id),
+        events_url=url_for("routes.generation_events", job_id=job_id),
+    )
+
+
+def _owned_job(job_id):
+    job = job_queue.get(job_id)
+    if not job or job["owner"] != _job_owner():
+        return None
+    return job
+
+
+@routes_bp.route("/generate/status/<job_id>")
+def generation_status(job_id):
+    if not is_allowed():
+        return jsonify({"status": "error", "message": "Login required"}), 401
+
+    job = _owned_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return jsonify(_generation_progress(job_id, job))
+
+
+def _generation_progress(job_id, job):
+    """Status payload for a generation job; starts the quiz once questions exist."""
+    result = job["result"] or {}
+    q_ids = result.get("question_ids", [])
+    payload = {"job_id": job_id, "status": job["status"], "ready": len(q_ids)}
+    if job["status"] == "failed":
+        payload["error"] = job["error"]
+        payload["redirect"] = url_for("routes.dashboard")
+        if session.get("pending_job") == job_id:
+            session.pop("pending_job")
+            flash(job["error"], "danger")
+    elif q_ids:
+        # Streaming jobs can start the quiz as soon as the first question lands
+        if session.get("pending_job") == job_id:
+            session.pop("pending_job")
+            start_quiz(q_ids, result.get("topic", "General"), result.get("difficulty", "medium"),
+                       job_id=job_id if job["status"] != "done" else None)
+            if result.get("pooled"):
+                question_pool.mark_seen(q_ids)
+        payload["redirect"] = url_for("routes.quiz_page", q_id=q_ids[0])
+    elif job["status"] == "done":
+        payload["redirect"] = url_for("routes.dashboard")
+    return payload
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@routes_bp.route("/generate/events/<job_id>")
+def generation_events(job_id):
+    """Server-Sent Events feed of questions as a generation job produces them."""
+    if not is_allowed():
+        return jsonify({"status": "error", "message": "Login required"}), 401
+    if not _owned_job(job_id):
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+
+    sent = request.args.get("after", 0, type=int)
+
+    def events():
+        nonlocal sent
+        since = 0.0
+        while True:
+            job = job_queue.wait(job_id, since, timeout=15.0)
+            if job is None:
+                return
+            if job["updated_at"] <= since:
+                yield ": keep-alive\n\n"
+                continue
+            since = job["updated_at"]
+
+            q_ids = (job["result"] or {}).get("question_ids", [])
+            if len(q_ids) > sent:
+                new_ids = q_ids[sent:]
+                rows = {q.id: q for q in Question.query.filter(Question.id.in_(new_ids)).all()}
+                for q_id in new_ids:
+                    q = rows.get(q_id)
+                    if q:
+                        yield _sse("question", {
+                            "index": sent,
+                            "id": q.id,
+                            "question": q.question_text,
+                            "options": json.loads(q.options_json) if q.options_json else {},
+                        })
+                    sent += 1
+                db.session.remove()
+
+            if job["status"] == "done":
+                yield _sse("done", {"total": len(q_ids)})
+                return
+            if job["status"] == "failed":
+                yield _sse("failed", {"error": job["error"], "total": len(q_ids)})
+                return
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sync_streaming_quiz():
+    """Pull newly streamed question ids into the session's quiz.
+
+    Never blocks: returns True while the model is still generating and the
+    player has already reached the last question it produced.
+    """
+    job_id = session.get("quiz_job")
+    if not job_id:
+        return False
+    job = job_queue.get(job_id)
+    if not job:
+        session.pop("quiz_job", None)
+        return False
+    result = job["result"] or {}
+    q_ids = result.get("question_ids", [])
+    known = session.get("active_questions", [])
+    if len(q_ids) > len(known):
+        if result.get("pooled"):
+            question_pool.mark_seen(q_ids[len(known):])
+        session["active_questions"] = q_ids
+    if job["status"] in ("done", "failed"):
+        session.pop("quiz_job", None)
+        return False
+    return session.get("current_idx", 0) >= len(session["active_questions"])
+
+
+def _quiz_stream():
+    """(expected total, SSE url) for a quiz whose questions are still streaming in."""
+    q_list = session.get("active_questions", [])
+    job = job_queue.get(session["quiz_job"]) if session.get("quiz_job") else None
+    if job and job["status"] not in ("done", "failed"):
+        total = max(len(q_list), (job["result"] or {}).get("expected", len(q_list)))
+        return total, url_for("routes.generation_events", job_id=job["id"], after=len(q_list))
+    return len(q_list), None
+
+
 @routes_bp.route("/quiz/<int:q_id>")
 def quiz_page(q_id):
     if not is_allowed():
@@ -398,16 +726,46 @@ def quiz_page(q_id):
 
     question = Question.query.get_or_404(q_id)
     options = json.loads(question.options_json) if question.options_json else {}
-    q_list = session.get("active_questions", [])
     current = session.get("current_idx", 0)
 
+    # Questions still streaming in: show the expected length and subscribe
+    total, events_url = _quiz_stream()
+
     return render_template(
         "quiz.html",
         question=question,
         options=options,
         current=current + 1,
-        total=len(q_list),
+        total=total,
         topic=session.get("quiz_topic", "Quiz"),
+        events_url=events_url,
+    )
+
+
+@routes_bp.route("/quiz/next")
+def quiz_next():
+    """Wait for the next streamed question without holding a worker."""
+    if not is_allowed():
+        return redirect(url_for("routes.login"))
+
+    pending = _sync_streaming_quiz()
+    q_list = session.get("active_questions", [])
+    current = session.get("current_idx", 0)
+    if current < len(q_list):
+        return redirect(url_for("routes.quiz_page", q_id=q_list[current]))
+    if not pending:
+        return redirect(url_for("routes.results"))
+
+    # quiz.html follows the SSE feed and comes back here once the question lands
+    total, events_url = _quiz_stream()
+    return render_template(
+        "quiz.html",
+        question=None,
+        options={},
+        current=current + 1,
+        total=total,
+        topic=session.get("quiz_topic", "Quiz"),
+        events_url=events_url,
     )
 
 
@@ -422,50 +780,149 @@ def submit_answer():
 
     is_correct = user_answer.strip().upper() == question.correct_answer.strip().upper()
 
-    # Save answer
+    # Ratings only learn from the first answer to a question in this quiz
     ans_list = session.get("user_answers", [])
-    ans_list.append({
-        "question": question.question_text,
-        "user_answer": user_answer,
-        "correct_answer": question.correct_answer,
-        "is_correct": is_correct,
-        "explanation": question.explanation,
-        "options": json.loads(question.options_json) if question.options_json else {},
-    })
+    rated = q_id in session.get("active_questions", []) and all(a[0] != q_id for a in ans_list)
+
+    # Save answer — only ids and letters; results() rebuilds the details
+    ans_list.append([q_id, user_answer, is_correct])
     session["user_answers"] = ans_list
 
     if is_correct:
         session["score"] = session.get("score", 0) + 1
-    elif not session.get("is_guest") and current_user.is_authenticated:
-        # Add to mistake bank
-        mistake = MistakeBank(
-            user_id=current_user.id,
-            question_text=question.question_text,
-            correct_answer=question.correct_answer,
-            options_json=question.options_json,
-            topic=session.get("quiz_topic", "General"),
-            explanation=question.explanation,
-        )
-        db.session.add(mistake)
+
+    def record():
+        if rated:
+            adaptive.record_answer(question, is_correct)
+        if not session.get("is_guest") and current_user.is_authenticated:
+            review_mistake(question, is_correct)
         safe_commit()
 
+    try:
+        record()
+    except IntegrityError:
+        # A concurrent request created the same mistake or ability row;
+        # the retry finds it and updates it instead
+        db.session.rollback()
+        record()
+
     # Next question or results
     session["current_idx"] = session.get("current_idx", 0) + 1
+    pending = _sync_streaming_quiz()
     q_list = session.get("active_questions", [])
 
     if session["current_idx"] < len(q_list):
         return redirect(url_for("routes.quiz_page", q_id=q_list[session["current_idx"]]))
+    if pending:
+        # Caught up with the model; the next page waits for it over SSE
+        return redirect(url_for("routes.quiz_next"))
     return redirect(url_for("routes.results"))
 
 
+def review_mistake(question, is_correct):
+    """Add a missed question to the Mistake Bank, or reschedule the copy already there.
+
+    Changes are left in the session for the caller to commit.
+    """
+    content_hash = MistakeBank.hash_for(question.question_text, question.correct_answer)
+    mistake = MistakeBank.query.filter_by(user_id=current_user.id, content_hash=content_hash).first()
+    if mistake is None:
+        if is_correct:
+            return
+        db.session.add(MistakeBank(
+            user_id=current_user.id,
+            question_text=question.question_text,
+            correct_answer=question.correct_answer,
+            options_json=question.options_json,
+            topic=session.get("quiz_topic", "General"),
+            explanation=question.explanation,
+            content_hash=content_hash,
+        ))
+        bump_user_stats(current_user.id, mistake_count=1)
+    else:
+        if not is_correct:
+            mistake.miss_count += 1
+        mistake.review(4 if is_correct else 1)
+
+
 # ═══════════════════════════════════════════════════════════════════
 # RESULTS
 # ═══════════════════════════════════════════════════════════════════
 
+def answer_details(compact):
+    """Expand session answers ``[q_id, answer, is_correct]`` using one question query."""
+    ids = [q_id for q_id, _, _ in compact]
+    questions = {q.id: q for q in Question.query.filter(Question.id.in_(ids))} if ids else {}
+    details = []
+    for q_id, user_answer, is_correct in compact:
+        question = questions.get(q_id)
+        details.append({
+            "question": question.question_text if question else "",
+            "user_answer": user_answer,
+            "correct_answer": question.correct_answer if question else "",
+            "is_correct": is_correct,
+            "explanation": question.explanation if question else "",
+            "options": json.loads(question.options_json) if question and question.options_json else {},
+        })
+    return details
+
+
+def save_result(score, total, topic, difficulty):
+    """Persist a finished quiz and roll it into streak, mastery and stats."""
+    new_res = QuizResult(
+        user_id=current_user.id,
+        score=score,
+        total_questions=total,
+        topic=topic,
+        difficulty=difficulty,
+        timestamp=datetime.utcnow(),
+    )
+    db.session.add(new_res)
+    record_accuracy(current_user.id, new_res.timestamp, score, total)
+
+    # Update streak
+    today = date.today()
+    if current_user.last_quiz_date:
+        last = current_user.last_quiz_date
+        if last == today:
+            pass  # same day
+        elif last == today - timedelta(days=1):
+            current_user.streak += 1
+        else:
+            current_user.streak = 1
+    else:
+        current_user.streak = 1
+    current_user.last_quiz_date = today
+
+    # Update topic mastery
+    mastery = TopicMastery.query.filter_by(
+        user_id=current_user.id, topic=topic
+    ).first()
+    if not mastery:
+        mastery = TopicMastery(
+            user_id=current_user.id, topic=topic,
+            correct_count=0, total_count=0,
+        )
+        db.session.add(mastery)
+    mastery.correct_count += score
+    mastery.total_count += total
+    bump_user_stats(current_user.id, quiz_count=1, correct_total=score, question_total=total)
+    safe_commit()
+    return new_res
+
+
+def generate_insight(job_id, result_id, wrong, topic):
+    """Job: write the AI insight for a saved quiz result."""
+    insight = ai.generate_performance_insight(wrong, topic)
+    QuizResult.query.filter_by(id=result_id).update({"insight": insight})
+    db.session.commit()
+    return {"result_id": result_id}
+
+
 @routes_bp.route("/results")
 def results():
     score = session.get("score", 0)
-    user_answers = session.get("user_answers", [])
+    user_answers = answer_details(session.get("user_answers", []))
     total = len(user_answers)
     topic = session.get("quiz_topic", "Quiz")
     difficulty = session.get("quiz_difficulty", "medium")
@@ -475,62 +932,40 @@ def results():
     history_scores = []
     is_guest = session.get("is_guest", False)
     ai_insight = ""
+    insight_url = None
 
     try:
         if not is_guest and current_user.is_authenticated:
-            # Save result
-            new_res = QuizResult(
-                user_id=current_user.id,
-                score=score,
-                total_questions=total,
-                topic=topic,
-                difficulty=difficulty,
-                timestamp=datetime.utcnow(),
-            )
-            db.session.add(new_res)
-
-            # Update streak
-            today = date.today()
-            if current_user.last_quiz_date:
-                last = current_user.last_quiz_date
-                if last == today:
-                    pass  # same day
-                elif last == today - timedelta(days=1):
-                    current_user.streak += 1
-                else:
-                    current_user.streak = 1
-            else:
-                current_user.streak = 1
-            current_user.last_quiz_date = today
-
-            # Update topic mastery
-            mastery = TopicMastery.query.filter_by(
-                user_id=current_user.id, topic=topic
-            ).first()
-            if not mastery:
-                mastery = TopicMastery(
-                    user_id=current_user.id, topic=topic,
-                    correct_count=0, total_count=0,
-                )
-                db.session.add(mastery)
-            mastery.correct_count += score
-            mastery.total_count += total
-            safe_commit()
+            # Save the result once; reloading the page shows the saved copy
+            result = None
+            if session.get("saved_result_id"):
+                result = db.session.get(QuizResult, session["saved_result_id"])
+            if result is None or result.user_id != current_user.id:
+                result = save_result(score, total, topic, difficulty)
+                session["saved_result_id"] = result.id
+                session.pop("insight_job", None)
+                session.pop("insight_pending", None)
+
+                # AI insight on mistakes, written in the background
+                wrong = [a for a in user_answers if not a["is_correct"]]
+                if wrong and job_queue.inline:
+                    # An inline job would hold the page for the LLM call;
+                    # the insight endpoint writes it when first polled instead
+                    session["insight_pending"] = result.id
+                elif wrong:
+                    try:
+                        session["insight_job"] = job_queue.submit(
+                            "insight", generate_insight, result.id, wrong, topic, owner=_job_owner()
+                        )
+                    except QueueFull:
+                        pass
 
             # History for chart
-            past = QuizResult.query.filter_by(
-                user_id=current_user.id
-            ).order_by(QuizResult.timestamp.asc()).all()
-            for r in past[-7:]:
-                history_labels.append(r.timestamp.strftime("%d %b"))
-                history_scores.append(
-                    int(r.score / r.total_questions * 100) if r.total_questions else 0
-                )
-
-            # AI insight on mistakes
-            wrong = [a for a in user_answers if not a["is_correct"]]
-            if wrong:
-                ai_insight = ai.generate_performance_insight(wrong, topic)
+            history_labels, history_scores = accuracy_history(current_user.id, "quiz", 7)
+
+            ai_insight = result.insight or ""
+            if not ai_insight and (session.get("insight_job") or session.get("insight_pending") == result.id):
+                insight_url = url_for("routes.result_insight", result_id=result.id)
         else:
             history_labels = ["Now"]
             history_scores = [int(accuracy)]
@@ -550,9 +985,102 @@ def results():
         history_labels=json.dumps(history_labels),
         history_scores=json.dumps(history_scores),
         ai_insight=ai_insight,
+        insight_url=insight_url,
+        history_ranges=HISTORY_RANGES,
     )
 
 
+@routes_bp.route("/results/<int:result_id>/insight")
+@login_required
+def result_insight(result_id):
+    """Poll for the background AI insight of a saved result (written here when jobs run inline)."""
+    result = db.session.get(QuizResult, result_id)
+    if not result or result.user_id != current_user.id:
+        return jsonify({"status": "error", "message": "Unknown result"}), 404
+    if result.insight:
+        return jsonify({"status": "ready", "insight": result.insight})
+    if session.get("insight_pending") == result_id:
+        session.pop("insight_pending")
+        wrong = [a for a in answer_details(session.get("user_answers", [])) if not a["is_correct"]]
+        try:
+            generate_insight(None, result_id, wrong, session.get("quiz_topic", "Quiz"))
+        except Exception as e:
+            db.session.rollback()
+            print(f"Insight error: {e}")
+            return jsonify({"status": "unavailable"})
+        db.session.refresh(result)
+        return jsonify({"status": "ready", "insight": result.insight})
+    job = _owned_job(session["insight_job"]) if session.get("insight_job") else None
+    if job and job["status"] in ("queued", "running"):
+        return jsonify({"status": "pending"})
+    return jsonify({"status": "unavailable"})
+
+
+# Chart ranges offered on the results page: label → (resolution, points)
+HISTORY_RANGES = {
+    "Last 7 quizzes": ("quiz", 7),
+    "30 days": ("day", 30),
+    "12 weeks": ("week", 12),
+    "12 months": ("month", 12),
+}
+HISTORY_LABEL_FORMATS = {"quiz": "%d %b", "day": "%d %b", "week": "Wk %d %b", "month": "%b %Y"}
+
+
+def accuracy_history(user_id, resolution, points):
+    """Return (labels, accuracy %) for the last ``points`` quizzes or calendar buckets.
+
+    Reads at most ``points`` rows through an index, however many quizzes
+    the user has taken. Calendar series always have ``points`` entries;
+    buckets without a quiz have accuracy None, drawn as a gap.
+    """
+    label_format = HISTORY_LABEL_FORMATS[resolution]
+    if resolution == "quiz":
+        rows = QuizResult.query.filter_by(user_id=user_id).order_by(
+            QuizResult.timestamp.desc()
+        ).limit(points).all()
+        rows.reverse()
+        return (
+            [r.timestamp.strftime(label_format) for r in rows],
+            [int(r.score / r.total_questions * 100) if r.total_questions else 0 for r in rows],
+        )
+
+    today = datetime.utcnow().date()  # rollup buckets use the UTC quiz timestamp
+    if resolution == "day":
+        start = today - timedelta(days=points - 1)
+    elif resolution == "week":
+        start = AccuracyRollup.bucket_for("week", today) - timedelta(weeks=points - 1)
+    else:
+        month_index = today.year * 12 + today.month - 1 - (points - 1)
+        start = date(month_index // 12, month_index % 12 + 1, 1)
+    rows = AccuracyRollup.query.filter(
+        AccuracyRollup.user_id == user_id,
+        AccuracyRollup.resolution == resolution,
+        AccuracyRollup.bucket >= start,
+    ).order_by(AccuracyRollup.bucket.asc()).all()
+    by_bucket = {r.bucket: r.accuracy for r in rows}
+    buckets = [start]
+    while len(buckets) < points:
+        last = buckets[-1]
+        if resolution == "day":
+            buckets.append(last + timedelta(days=1))
+        elif resolution == "week":
+            buckets.append(last + timedelta(weeks=1))
+        else:
+            buckets.append((last + timedelta(days=32)).replace(day=1))
+    return [b.strftime(label_format) for b in buckets], [by_bucket.get(b) for b in buckets]
+
+
+@routes_bp.route("/api/history")
+@login_required
+def history_api():
+    resolution = request.args.get("resolution", "quiz")
+    if resolution not in HISTORY_LABEL_FORMATS:
+        return jsonify({"status": "error", "message": "Unknown resolution"}), 400
+    points = max(1, min(request.args.get("points", 7, type=int), 366))
+    labels, scores = accuracy_history(current_user.id, resolution, points)
+    return jsonify({"resolution": resolution, "labels": labels, "scores": scores})
+
+
 # ═══════════════════════════════════════════════════════════════════
 # LIBRARY & MISTAKES
 # ═══════════════════════════════════════════════════════════════════
@@ -567,13 +1095,20 @@ def library():
     results = QuizResult.query.filter_by(
         user_id=current_user.id
     ).order_by(QuizResult.timestamp.desc()).all()
-    return render_template("library.html", results=results)
+    return render_template(
+        "library.html",
+        results=results,
+        documents=documents.library(current_user.id),
+        study_sets=study.library(current_user.id),
+    )
 
 
 @routes_bp.route("/review-mistakes")
 @login_required
 def review_mistakes():
-    mistakes = MistakeBank.query.filter_by(user_id=current_user.id).all()
+    mistakes = MistakeBank.query.filter_by(user_id=current_user.id) \
+        .order_by(MistakeBank.due_at.asc()).all()
+    now = datetime.utcnow()
     processed = []
     for m in mistakes:
         processed.append({
@@ -583,8 +1118,12 @@ def review_mistakes():
             "options": json.loads(m.options_json) if m.options_json else {},
             "topic": m.topic,
             "explanation": m.explanation,
+            "miss_count": m.miss_count,
+            "due": m.due_at is None or m.due_at <= now,
+            "due_at": m.due_at,
         })
-    return render_template("review.html", mistakes=processed)
+    due_count = sum(1 for m in processed if m["due"])
+    return render_template("review.html", mistakes=processed, due_count=due_count)
 
 
 @routes_bp.route("/delete-mistake/<int:m_id>", methods=["POST"])
@@ -593,6 +1132,7 @@ def delete_mistake(m_id):
     m = MistakeBank.query.get_or_404(m_id)
     if m.user_id == current_user.id:
         db.session.delete(m)
+        bump_user_stats(current_user.id, mistake_count=-1)
         safe_commit()
         flash("Mistake removed!", "success")
     return redirect(url_for("routes.review_mistakes"))
@@ -602,6 +1142,19 @@ def delete_mistake(m_id):
 # AI STUDY HUB
 # ═══════════════════════════════════════════════════════════════════
 
+def _document_text(kind, f):
+    """Text of an uploaded file, extracted once per distinct file."""
+    if not f or not f.filename:
+        return ""
+    user_id = current_user.id if current_user.is_authenticated else None
+    document = documents.load(kind, user_id, documents.digest(f), f)
+    if document is None:
+        return ""
+    safe_commit()
+    _queue_topic_detection(document)
+    return document.text
+
+
 @routes_bp.route("/study-hub", methods=["GET", "POST"])
 def study_hub():
     if not is_allowed():
@@ -613,6 +1166,7 @@ def study_hub():
     # POST — generate study material
     source_type = request.form.get("source_type", "topic")
     content = ""
+    title = None
 
     try:
         if source_type == "topic":
@@ -621,30 +1175,42 @@ def study_hub():
                 flash("Please enter a topic.", "danger")
                 return redirect(url_for("routes.study_hub"))
             content = f"Create comprehensive study material about: {topic_name}"
+            title = topic_name
         elif source_type == "text":
             content = request.form.get("raw_text", "").strip()
         elif source_type == "pdf":
             content = request.form.get("raw_text", "").strip()  # client-side extracted
+            f = request.files.get("pdf_file")
+            title = f.filename if f and f.filename else None
             if not content:
-                f = request.files.get("pdf_file")
-                if f and f.filename:
-                    content = extract_text_from_pdf(f)
+                content = _document_text("pdf", f)
         elif source_type == "image":
             f = request.files.get("image_file")
-            if f and f.filename:
-                content = extract_text_from_image(f)
+            title = f.filename if f and f.filename else None
+            content = _document_text("image", f)
 
-        content = clean_text(content)
+        content = clean_text(content, keep_paragraphs=True)
         if not content:
             flash("No content provided. Please enter text, upload a file, or specify a topic.", "danger")
             return redirect(url_for("routes.study_hub"))
 
-        if not ai.client:
-            flash("OPENROUTER_API_KEY is not configured. Please add your API key.", "danger")
-            return redirect(url_for("routes.study_hub"))
-
-        material = ai.generate_study_material(content)
-        return render_template("study_hub_result.html", material=material)
+        # The same content (from anyone) is served from the store without an LLM call
+        key = study.content_hash(content)
+        study_set = study.find(key)
+        if study_set is None:
+            if not ai.client:
+                flash("OPENROUTER_API_KEY is not configured. Please add your API key.", "danger")
+                return redirect(url_for("routes.study_hub"))
+            material = ai.generate_study_material(content)
+            if not (material.get("flashcards") or material.get("key_concepts")):
+                # Nothing worth keeping — show it once, don't store it
+                return render_template("study_hub_result.html", material=material)
+            study_set = study.save(key, content, material, source_type, title)
+        else:
+            print(f"[Study] Serving stored set {study_set.id} ({study_set.title})")
+        study.remember(study_set)
+        safe_commit()
+        return redirect(url_for("routes.study_set", set_id=study_set.id))
 
     except Exception as e:
         print(f"Study Hub error: {e}")
@@ -652,3 +1218,42 @@ def study_hub():
         traceback.print_exc()
         flash(f"Error generating study material: {str(e)}", "danger")
         return redirect(url_for("routes.study_hub"))
+
+
+@routes_bp.route("/study-sets/<int:set_id>")
+def study_set(set_id):
+    if not is_allowed():
+        return redirect(url_for("routes.login"))
+    stored = db.session.get(StudySet, set_id)
+    if stored is None or not study.can_open(set_id):
+        flash("That study set isn't in your library.", "warning")
+        return redirect(url_for("routes.study_hub"))
+    return render_template("study_hub_result.html", material=study.material(stored), study_set=stored)
+
+
+@routes_bp.route("/study-sets/<int:set_id>/regenerate", methods=["POST"])
+def regenerate_study_set(set_id):
+    if not is_allowed():
+        return redirect(url_for("routes.login"))
+    stored = db.session.get(StudySet, set_id)
+    if stored is None or not study.can_open(set_id):
+        flash("That study set isn't in your library.", "warning")
+        return redirect(url_for("routes.study_hub"))
+    if not ai.client:
+        flash("OPENROUTER_API_KEY is not configured. Please add your API key.", "danger")
+        return redirect(url_for("routes.study_set", set_id=set_id))
+
+    try:
+        material = ai.generate_study_material(stored.content, use_cache=False)
+        if material.get("flashcards") or material.get("key_concepts"):
+            study.save(stored.content_hash, stored.content, material, stored.source_type, stored.title)
+            study.remember(stored)
+            safe_commit()
+            flash("Fresh study material generated!", "success")
+        else:
+            flash("Couldn't generate new material right now — showing the saved copy.", "warning")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Study Hub error: {e}")
+        flash(f"Error generating study material: {str(e)}", "danger")
+    return redirect(url_for("routes.study_set", set_id=set_id))
@@ -5,72 +5,168 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from backend import metrics
 
-def extract_text_from_pdf(file_obj, upload_folder="/tmp/uploads"):
-    """Extract text from an uploaded PDF file."""
+
+# Documents with at least this many pages are parsed across a process pool,
+# one contiguous page range per worker
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 40))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 2))
+_pdf_pool = None
+
+# Images are downsized and recompressed before the vision call (needs Pillow)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 2048))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+VISION_MODEL = "openrouter/free"
+OCR_PROMPT = "Extract ALL text content from this image. Return ONLY the extracted text, nothing else. If there is no text, describe the educational content of the image in detail so quiz questions can be generated from it."
+
+
+def _get_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Spawned, not forked: this process runs job, HTTP and prober threads
+        # whose locks a forked child would inherit mid-flight
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pdf_pool
+
+
+def _pdf_page_texts(reader, stream):
+    """The text of every page, in order.
+
+    Large documents are split into one page range per process-pool worker,
+    so the bytes are sent and parsed once per worker.
+    """
+    stop = len(reader.pages)
+    if stop < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        return [reader.pages[i].extract_text() or "" for i in range(stop)]
+    from backend.pdf_worker import extract_page_range
     try:
-        import pypdf
-        os.makedirs(upload_folder, exist_ok=True)
-        path = os.path.join(upload_folder, file_obj.filename)
-        file_obj.save(path)
-
-        reader = pypdf.PdfReader(path)
-        text = " ".join(
-            [page.extract_text() for page in reader.pages if page.extract_text()]
-        )
-        try:
-            os.remove(path)
-        except OSError:
-            pass
-        return text.strip()
+        stream.seek(0)
+        data = stream.read()
+        pool = _get_pdf_pool()
+        step = -(-stop // PDF_WORKERS)
+        futures = [pool.submit(extract_page_range, data, start, min(start + step, stop))
+                   for start in range(0, stop, step)]
+        return [text for future in futures for text in future.result()]
+    except (OSError, RuntimeError) as e:
+        # Process pools are unavailable on some hosts (e.g. serverless)
+        print(f"[PDF] Parallel extraction unavailable ({e}); continuing serially")
+        return [reader.pages[i].extract_text() or "" for i in range(stop)]
+
+
+@metrics.timed(metrics.EXTRACTION_DURATION, "pdf")
+def extract_pdf(file_obj):
+    """Extract text from an uploaded PDF file; returns ``(text, page_count)``."""
+    import pypdf
+    try:
+        stream = getattr(file_obj, "stream", file_obj)
+        reader = pypdf.PdfReader(stream)
+        text = "\n\n".join(t for t in _pdf_page_texts(reader, stream) if t)
+        return text.strip(), len(reader.pages)
     except Exception as e:
         print(f"PDF extraction error: {e}")
-        return ""
+        return "", None
+
+
+def extract_text_from_pdf(file_obj):
+    """Extract text from an uploaded PDF file."""
+    return extract_pdf(file_obj)[0]
+
 
+IMAGE_MIME_TYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png',
+                    'gif': 'image/gif', 'webp': 'image/webp', 'bmp': 'image/bmp'}
+
+
+def prepare_image(image_bytes, filename="image.png"):
+    """Shrink an upload for the vision model: returns (bytes, mime_type).
+
+    Applies EXIF rotation, caps the longest side at IMAGE_MAX_DIMENSION,
+    flattens transparency and re-encodes as JPEG. EXIF and other metadata
+    are dropped, and any format Pillow can read (BMP, TIFF, GIF, ...) is
+    converted. Small JPEG/PNG/WebP files that would only grow are kept as
+    they are. Without Pillow, or for unreadable files, the original bytes
+    are sent as before.
+    """
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'png'
+    original = (image_bytes, IMAGE_MIME_TYPES.get(ext, 'image/png'))
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return original
+
+    import io
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.seek(0)  # first frame of animated images
+            size = img.size
+            if img.format == "JPEG":
+                # Let the decoder downscale by a power of two while reading
+                img.draft("RGB", (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+            if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, "white")
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        print(f"[Image] Preprocessing skipped: {e}")
+        return original
 
+    prepared = out.getvalue()
+    if len(prepared) >= len(image_bytes) and size == img.size and \
+            original[1] in ("image/jpeg", "image/png", "image/webp"):
+        # Already small and web-safe — re-encoding would only make it bigger
+        return original
+    print(f"[Image] Preprocessed {size[0]}x{size[1]} → {img.size[0]}x{img.size[1]}, "
+          f"{len(image_bytes) // 1024}KB → {len(prepared) // 1024}KB")
+    return prepared, "image/jpeg"
+
+
+@metrics.timed(metrics.EXTRACTION_DURATION, "ocr")
 def extract_text_from_image(file_obj):
-    """Extract text from an image using AI vision via OpenRouter."""
+    """Extract text from an image using AI vision via OpenRouter.
+
+    Results are cached by the SHA-256 of the uploaded bytes, so the same
+    slide or worksheet uploaded again skips the vision call.
+    """
     import base64
+    import hashlib
+    from backend.cache import response_cache
     try:
-        # Read image bytes and encode to base64
         image_bytes = file_obj.read()
         if not image_bytes:
             return ""
 
-        # Detect MIME type from filename
-        filename = getattr(file_obj, 'filename', 'image.png') or 'image.png'
-        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'png'
-        mime_map = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png',
-                    'gif': 'image/gif', 'webp': 'image/webp', 'bmp': 'image/bmp'}
-        mime_type = mime_map.get(ext, 'image/png')
-
-        b64_data = base64.b64encode(image_bytes).decode('utf-8')
-        data_url = f"data:{mime_type};base64,{b64_data}"
+        cache_key = response_cache.make_key(
+            "ocr", image=hashlib.sha256(image_bytes).hexdigest(), model=VISION_MODEL, prompt=OCR_PROMPT,
+        )
+        cached = response_cache.get(cache_key)
+        if cached:
+            print(f"[Image] OCR cache hit ({len(cached)} chars)")
+            return cached
 
-        # Use OpenRouter AI vision to extract text
-        from openai import OpenAI
-        api_key = os.getenv("OPENROUTER_API_KEY", "")
-        if not api_key:
+        # Use OpenRouter AI vision through the shared engine (retries, deadline, breaker, metrics)
+        from backend.routes import ai
+        if ai.client is None:
             print("[Image] No OPENROUTER_API_KEY — cannot process image")
             return ""
 
-        client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
-        response = client.chat.completions.create(
-            model="openrouter/free",
-            messages=[{
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Extract ALL text content from this image. Return ONLY the extracted text, nothing else. If there is no text, describe the educational content of the image in detail so quiz questions can be generated from it."},
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                ],
-            }],
-            max_tokens=2000,
-        )
-        if response and response.choices:
-            text = response.choices[0].message.content
-            print(f"[Image] AI vision extracted {len(text)} chars")
-            return text.strip() if text else ""
-        return ""
+        filename = getattr(file_obj, 'filename', 'image.png') or 'image.png'
+        image_data, mime_type = prepare_image(image_bytes, filename)
+        b64_data = base64.b64encode(image_data).decode('utf-8')
+        data_url = f"data:{mime_type};base64,{b64_data}"
+
+        text = ai.read_image(data_url, VISION_MODEL, OCR_PROMPT)
+        print(f"[Image] AI vision extracted {len(text)} chars")
+        if text:
+            response_cache.set(cache_key, text)
+        return text
     except Exception as e:
         print(f"Image extraction error: {e}")
         import traceback
@@ -78,16 +174,184 @@ def extract_text_from_image(file_obj):
         return ""
 
 
-def clean_text(text):
-    """Clean and normalize extracted text."""
+def clean_text(text, keep_paragraphs=False):
+    """Clean and normalize extracted text.
+
+    With ``keep_paragraphs`` the section structure survives as blank-line
+    separated paragraphs (headings become their own paragraph), so the text
+    can later be split with :func:`chunk_text`.
+    """
     if not text:
         return ""
     import re
+    if keep_paragraphs:
+        paragraphs = []
+        for block in re.split(r'\n\s*\n', text):
+            current = []
+            for line in block.splitlines():
+                line = clean_text(line)
+                if not line:
+                    continue
+                if _looks_like_heading(line):
+                    if current:
+                        paragraphs.append(" ".join(current))
+                    paragraphs.append(line)
+                    current = []
+                else:
+                    current.append(line)
+            if current:
+                paragraphs.append(" ".join(current))
+        return "\n\n".join(paragraphs)
     text = re.sub(r'\s+', ' ', text)
     text = re.sub(r'[^\x00-\x7F]+', ' ', text)
     return text.strip()
 
 
+def canonical_topic(name):
+    """Canonical topic key, e.g. '  Photo-Synthesis! ' -> 'photo synthesis'."""
+    if not name:
+        return ""
+    import re
+    return re.sub(r'[^a-z0-9]+', ' ', clean_text(name).lower()).strip()[:200]
+
+
+def _looks_like_heading(line):
+    """Short, unpunctuated lines (or numbered ones like '2.1 Scope') start a section."""
+    import re
+    if len(line) > 80 or line.endswith((".", ",", ";", ":", "?", "!")):
+        return False
+    if re.match(r'^(\d+(\.\d+)*|[IVX]+\.|Chapter|Section|Unit|Part)\s+\S', line):
+        return True
+    words = line.split()
+    return 0 < len(words) <= 8 and (line.isupper() or line.istitle())
+
+
+def chunk_text(text, max_chars=4000):
+    """Split text into chunks of at most ``max_chars``, preferring section breaks.
+
+    Paragraphs are packed together until a chunk is full; a paragraph that
+    is too long on its own is split at sentence boundaries.
+    """
+    if not text:
+        return []
+    import re
+    pieces = []
+    for para in re.split(r'\n\s*\n', text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', para):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+
+_COMPACT_STOPWORDS = frozenset(
+    "the and for are was were been being with that this these those from into onto than then there "
+    "their they them its it's his her our your you which what when where who whom whose how why also "
+    "such can could would should may might must will shall has have had not but all any each other "
+    "more most some only very just over under about after before between during through".split()
+)
+
+
+def estimate_tokens(text):
+    """Rough token count for English prose (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def compact_text(text, max_tokens):
+    """Keep the most salient sentences of ``text`` within a token budget.
+
+    Each sentence is scored by the cosine similarity of its TF-IDF vector
+    to the whole document's — a single-step TextRank: sentences built from
+    the document's dominant vocabulary rank highest. Boilerplate goes first:
+    sentences repeated three or more times (running headers, footers),
+    later copies of repeated sentences and fragments with fewer than three
+    content words. The best sentences are packed greedily into the budget,
+    skipping any that mostly repeat the words of one already kept, and
+    returned in document order with paragraph breaks kept. Text that
+    already fits is returned unchanged.
+    """
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+    import math
+    import re
+    from collections import Counter
+
+    sentences = []  # (paragraph index, sentence)
+    for p_idx, para in enumerate(re.split(r'\n\s*\n', text)):
+        for sentence in re.split(r'(?<=[.!?])\s+', para):
+            sentence = clean_text(sentence)
+            if sentence:
+                sentences.append((p_idx, sentence))
+
+    repeats = Counter(s.lower() for _, s in sentences)
+    terms = [
+        [w for w in re.findall(r"[a-z][a-z0-9'-]+", s.lower()) if len(w) > 2 and w not in _COMPACT_STOPWORDS]
+        for _, s in sentences
+    ]
+    df = Counter(w for words in terms for w in set(words))
+    n = len(sentences)
+    idf = {w: math.log((1 + n) / (1 + d)) + 1 for w, d in df.items()}
+    centroid = Counter()
+    for words in terms:
+        for w in words:
+            centroid[w] += idf[w]
+    centroid_norm = math.sqrt(sum(v * v for v in centroid.values())) or 1.0
+
+    seen, candidates = set(), []
+    for i, ((_, sentence), words) in enumerate(zip(sentences, terms)):
+        key = sentence.lower()
+        if len(words) < 3 or repeats[key] >= 3 or key in seen:
+            continue
+        seen.add(key)
+        vector = Counter()
+        for w in words:
+            vector[w] += idf[w]
+        norm = math.sqrt(sum(v * v for v in vector.values()))
+        score = sum(v * centroid[w] for w, v in vector.items()) / (norm * centroid_norm)
+        candidates.append((score, i))
+
+    picked, picked_words, used = [], [], 0
+    for score, i in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        cost = estimate_tokens(sentences[i][1]) + 1
+        if used + cost > max_tokens:
+            continue
+        words = set(terms[i])
+        if any(len(words & other) / len(words | other) >= 0.7 for other in picked_words):
+            continue  # says nearly the same as a sentence already kept
+        picked.append(i)
+        picked_words.append(words)
+        used += cost
+    if not picked:
+        return text[:max_tokens * 4]
+
+    paragraphs = {}
+    for i in sorted(picked):
+        p_idx, sentence = sentences[i]
+        paragraphs.setdefault(p_idx, []).append(sentence)
+    compacted = "\n\n".join(" ".join(group) for group in paragraphs.values())
+    print(f"[Compact] {estimate_tokens(text)} → {estimate_tokens(compacted)} tokens "
+          f"({len(picked)}/{n} sentences)")
+    return compacted
+
 # ── OTP Email ────────────────────────────────────────────────────
 
 def generate_otp():
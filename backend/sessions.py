@@ -0,0 +1,124 @@
+"""Server-side sessions — the cookie carries only an opaque id, state lives in SQLite."""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from werkzeug.datastructures import CallbackDict
+
+from backend.cache import local_db_path
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it has been changed."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # Rotate the id when the logged-in user changes (prevents session fixation)
+        self.loaded_user = self.get("_user_id")
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Stores session data in a local SQLite table, keyed by a random id.
+
+    Values are encoded with Flask's tagged JSON serializer, so anything the
+    default cookie session accepts works unchanged. Expired rows are swept
+    at most once per ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, path=None, sweep_interval=None):
+        self.path = path or os.getenv("SESSION_DB_PATH") or local_db_path("sessions.db")
+        self.sweep_interval = float(sweep_interval or os.getenv("SESSION_SWEEP_INTERVAL", 600))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._last_sweep = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _sweep(self, now):
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        removed = self._db().execute("DELETE FROM sessions WHERE expires_at < ?", (now,)).rowcount
+        if removed:
+            print(f"[Sessions] Swept {removed} expired session(s)")
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+                ).fetchone()
+            if row is not None:
+                try:
+                    return ServerSession(session_json_serializer.loads(row[0]), sid=sid)
+                except ValueError:
+                    pass
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                with self._lock:
+                    self._db().execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                    self._db().commit()
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not self.should_set_cookie(app, session):
+            return
+
+        now = time.time()
+        old_sid = None
+        if not session.new and session.get("_user_id") != session.loaded_user:
+            old_sid, session.sid = session.sid, secrets.token_urlsafe(32)
+
+        expires_at = now + app.permanent_session_lifetime.total_seconds()
+        data = session_json_serializer.dumps(dict(session))
+        with self._lock:
+            conn = self._db()
+            if old_sid:
+                conn.execute("DELETE FROM sessions WHERE sid = ?", (old_sid,))
+            conn.execute(
+                "INSERT INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                (session.sid, data, expires_at),
+            )
+            self._sweep(now)
+            conn.commit()
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -0,0 +1,114 @@
+"""Study Hub store — generated study material saved once per normalized content hash.
+
+Notes, key concepts and flashcards are kept as rows so a set can be shown
+(and later searched or reviewed) without re-asking the model. Sets are
+shared: anyone submitting the same topic or text gets the stored copy,
+and each user keeps a library of the sets they opened.
+"""
+import hashlib
+from datetime import datetime
+
+from flask import session
+from flask_login import current_user
+
+from backend.models import Flashcard, StudyNote, StudySet, UserStudySet, db
+
+LIBRARY_SIZE = 50
+
+
+def content_hash(content):
+    """Hash of the content with case and whitespace normalized."""
+    normalized = " ".join(content.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def find(key):
+    return StudySet.query.filter_by(content_hash=key).first()
+
+
+def _title(source_type, content, material, title=None):
+    if title:
+        return title[:200]
+    if source_type == "topic" and content.startswith("Create comprehensive study material about: "):
+        return content.split(": ", 1)[1][:200]
+    concepts = material.get("key_concepts") or []
+    if concepts:
+        return str(concepts[0])[:200]
+    return " ".join(content.split()[:8])[:200]
+
+
+def save(key, content, material, source_type, title=None):
+    """Create or overwrite the study set for ``key`` from generated material.
+
+    Changes are left in the session for the caller to commit.
+    """
+    now = datetime.utcnow()
+    study_set = find(key)
+    if study_set is None:
+        study_set = StudySet(content_hash=key, content=content, created_at=now)
+        db.session.add(study_set)
+    else:
+        StudyNote.query.filter_by(study_set_id=study_set.id).delete()
+        Flashcard.query.filter_by(study_set_id=study_set.id).delete()
+    study_set.title = _title(source_type, content, material, title)
+    study_set.source_type = source_type
+    study_set.eli10 = material.get("eli10") or ""
+    study_set.mnemonic_story = material.get("mnemonic_story") or ""
+    study_set.updated_at = now
+    db.session.flush()
+
+    notes = [("note", note) for note in material.get("shorthand_notes") or []]
+    notes += [("concept", concept) for concept in material.get("key_concepts") or []]
+    positions = {}
+    for kind, value in notes:
+        if str(value).strip():
+            positions[kind] = positions.get(kind, -1) + 1
+            db.session.add(StudyNote(study_set_id=study_set.id, kind=kind,
+                                     position=positions[kind], text=str(value)))
+    for position, card in enumerate(c for c in material.get("flashcards") or [] if c):
+        front, back = (card.get("front", ""), card.get("back", "")) if isinstance(card, dict) else (card, "")
+        db.session.add(Flashcard(study_set_id=study_set.id, position=position,
+                                 front=str(front), back=str(back)))
+    return study_set
+
+
+def material(study_set):
+    """The set's rows in the shape ``study_hub_result.html`` renders."""
+    notes = StudyNote.query.filter_by(study_set_id=study_set.id) \
+        .order_by(StudyNote.kind, StudyNote.position).all()
+    cards = Flashcard.query.filter_by(study_set_id=study_set.id).order_by(Flashcard.position).all()
+    return {
+        "shorthand_notes": [n.text for n in notes if n.kind == "note"],
+        "eli10": study_set.eli10,
+        "mnemonic_story": study_set.mnemonic_story,
+        "flashcards": [{"front": c.front, "back": c.back} for c in cards],
+        "key_concepts": [n.text for n in notes if n.kind == "concept"],
+    }
+
+
+def remember(study_set):
+    """Add the set to the current user's library (guests keep it in the session)."""
+    if current_user.is_authenticated and not session.get("is_guest"):
+        entry = db.session.get(UserStudySet, (current_user.id, study_set.id))
+        if entry is None:
+            db.session.add(UserStudySet(user_id=current_user.id, study_set_id=study_set.id,
+                                        opened_at=datetime.utcnow()))
+        else:
+            entry.opened_at = datetime.utcnow()
+    else:
+        opened = [i for i in session.get("study_sets", []) if i != study_set.id]
+        session["study_sets"] = [study_set.id, *opened][:LIBRARY_SIZE]
+
+
+def can_open(study_set_id):
+    if current_user.is_authenticated and not session.get("is_guest"):
+        return db.session.get(UserStudySet, (current_user.id, study_set_id)) is not None
+    return study_set_id in session.get("study_sets", [])
+
+
+def library(user_id, limit=LIBRARY_SIZE):
+    """A user's study sets (id, title, source_type, opened_at), newest first — one indexed query."""
+    return db.session.query(StudySet.id, StudySet.title, StudySet.source_type, UserStudySet.opened_at) \
+        .join(UserStudySet, UserStudySet.study_set_id == StudySet.id) \
+        .filter(UserStudySet.user_id == user_id) \
+        .order_by(UserStudySet.opened_at.desc()).limit(limit).all()
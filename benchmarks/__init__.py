@@ -0,0 +1 @@
+"""Micro-benchmarks for the request hot paths (run with ``python -m benchmarks.run``)."""
@@ -0,0 +1,149 @@
+"""Synthetic data for the benchmarks: heavy users, long texts and large PDFs."""
+import json
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from backend.models import MistakeBank, Question, QuizResult, TopicMastery, User, db
+
+TOPICS = ["Biology", "Chemistry", "World History", "Algebra", "Physics", "Economics", "Geography", "Literature"]
+_WORDS = (
+    "cell membrane protein enzyme energy glucose nucleus ribosome transport gradient molecule reaction "
+    "oxygen carbon structure function process system pathway signal receptor hormone tissue organ "
+    "evolution species population climate market supply demand equation variable theorem proof"
+).split()
+PASSWORD = "benchmark"
+
+
+def sentence(rng, words=14):
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def long_text(words, seed=0):
+    """Extracted-looking text: paragraphs, page furniture and stray whitespace."""
+    rng = random.Random(seed)
+    lines, count, page = [], 0, 1
+    while count < words:
+        n = rng.randint(8, 24)
+        lines.append("  " + sentence(rng, n) + "   ")
+        count += n
+        if rng.random() < 0.15:
+            lines.append("")
+        if rng.random() < 0.03:
+            lines.extend([f"Page {page}", "", "Chapter summary", ""])
+            page += 1
+    return "\n".join(lines)
+
+
+def make_pdf(pages, lines=40, seed=0):
+    """A text-only PDF with ``pages`` pages of ``lines`` lines each."""
+    rng = random.Random(seed)
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        text = b"BT /F1 10 Tf 50 750 Td 12 TL " + b" ".join(
+            b"(" + sentence(rng, 10).encode("ascii") + b") '" for _ in range(lines)
+        ) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(text) + text + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % len(kids)
+
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def options_json(rng):
+    return json.dumps({key: sentence(rng, 6) for key in "ABCD"})
+
+
+def _batches(rows, size=5000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed_user(username, quiz_results, mistakes, questions=20, seed=0):
+    """Create a user with ``quiz_results`` results and ``mistakes`` mistake-bank rows.
+
+    Returns ``(user_id, question_ids)``. Rows are bulk-inserted; run
+    ``backfill-stats`` afterwards so the dashboard rollups match.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    user = User(username=username, email=f"{username}@bench.local",
+                streak=rng.randint(0, 30), last_quiz_date=now.date())
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+
+    results = []
+    for _ in range(quiz_results):
+        total = rng.choice([5, 10, 15])
+        results.append({
+            "user_id": user.id,
+            "score": rng.randint(0, total),
+            "total_questions": total,
+            "topic": rng.choice(TOPICS),
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "timestamp": now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+        })
+    for batch in _batches(results):
+        db.session.execute(insert(QuizResult), batch)
+
+    rows = []
+    for i in range(mistakes):
+        text = f"{sentence(rng)} ({i})"
+        answer = rng.choice("ABCD")
+        rows.append({
+            "user_id": user.id,
+            "question_text": text,
+            "correct_answer": answer,
+            "options_json": options_json(rng),
+            "topic": rng.choice(TOPICS),
+            "explanation": sentence(rng, 20),
+            "added_at": now - timedelta(days=rng.randint(0, 365)),
+            "content_hash": MistakeBank.hash_for(text, answer),
+            "miss_count": rng.randint(1, 4),
+            "due_at": now + timedelta(days=rng.randint(-30, 30)),
+            "interval_days": float(rng.randint(0, 30)),
+            "ease": 2.5,
+            "repetitions": rng.randint(0, 5),
+        })
+    for batch in _batches(rows):
+        db.session.execute(insert(MistakeBank), batch)
+
+    for topic in TOPICS:
+        total = rng.randint(50, 500)
+        db.session.add(TopicMastery(user_id=user.id, topic=topic,
+                                    correct_count=rng.randint(0, total), total_count=total))
+
+    question_ids = []
+    for i in range(questions):
+        question = Question(
+            question_text=f"{sentence(rng)} ({i})",
+            options_json=options_json(rng),
+            correct_answer=rng.choice("ABCD"),
+            explanation=sentence(rng, 20),
+            topic=TOPICS[0],
+            difficulty="medium",
+        )
+        db.session.add(question)
+        db.session.flush()
+        question_ids.append(question.id)
+
+    db.session.commit()
+    return user.id, question_ids
@@ -0,0 +1,220 @@
+"""Run the hot-path benchmarks and save the timings as JSON.
+
+    python -m benchmarks.run                          # full dataset
+    python -m benchmarks.run --quick                  # small dataset, for a fast sanity check
+    python -m benchmarks.run --compare benchmarks/results/previous.json
+
+Everything runs against a throwaway SQLite database (or ``--database-url``)
+with the LLM disabled, so timings cover only our own code: text cleaning,
+PDF extraction, ``options_json`` decoding and the queries + template
+rendering behind each page. Every benchmark reports min/median/mean/p95 in
+milliseconds; ``--compare`` flags benchmarks whose median got slower than
+``--threshold`` times the previous run.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+SIZES = {
+    "full": {"quiz_results": 10000, "mistakes": 50000, "pdf_pages": 200, "text_words": 200000},
+    "quick": {"quiz_results": 1000, "mistakes": 5000, "pdf_pages": 20, "text_words": 20000},
+}
+
+
+def measure(func, repeat, warmup=1):
+    """Time ``func`` ``repeat`` times after ``warmup`` untimed calls (milliseconds)."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(samples)
+    return {
+        "runs": repeat,
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+        "stdev_ms": round(statistics.stdev(ordered), 3) if len(ordered) > 1 else 0.0,
+    }
+
+
+def _configure_env(workdir, database_url):
+    """Point the app at scratch storage and switch off every outside dependency."""
+    os.environ.update({
+        "DATABASE_URL": database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.db"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "OPENROUTER_API_KEY": "",
+        "HEALTH_PROBE_INTERVAL": "0",
+    })
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _assert_ok(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+
+
+def run_benchmarks(size, repeat, only=None):
+    from benchmarks import datasets
+    from backend import services
+    from backend.models import MistakeBank, QuizResult, db
+    import main
+
+    app = main.app
+    sizes = SIZES[size]
+    results = {}
+
+    def bench(name, func, runs=repeat, **info):
+        if only and not any(pattern in name for pattern in only):
+            return
+        print(f"[Bench] {name} ...", flush=True)
+        results[name] = {**measure(func, runs), **info}
+        print(f"[Bench] {name}: median {results[name]['median_ms']} ms", flush=True)
+
+    # ── Text processing ──────────────────────────────────────────────
+    text = datasets.long_text(sizes["text_words"])
+    bench("clean_text", lambda: services.clean_text(text), chars=len(text))
+    bench("clean_text keep_paragraphs", lambda: services.clean_text(text, keep_paragraphs=True), chars=len(text))
+
+    for pages in sorted({10, sizes["pdf_pages"]}):
+        pdf = datasets.make_pdf(pages)
+        bench(f"extract_text_from_pdf {pages} pages",
+              lambda: services.extract_text_from_pdf(io.BytesIO(pdf)),
+              runs=max(3, repeat // 4), pages=pages, bytes=len(pdf))
+
+    # ── Database + routes ────────────────────────────────────────────
+    with app.app_context():
+        started = time.perf_counter()
+        user_id, question_ids = datasets.seed_user(
+            "bench", sizes["quiz_results"], sizes["mistakes"], seed=1,
+        )
+        app.test_cli_runner().invoke(args=["backfill-stats"])
+        saved = QuizResult(user_id=user_id, score=4, total_questions=5, topic=datasets.TOPICS[0],
+                           difficulty="medium", timestamp=datetime.utcnow(), insight="Benchmark insight.")
+        db.session.add(saved)
+        db.session.commit()
+        saved_id = saved.id
+        seeded_s = round(time.perf_counter() - started, 1)
+        print(f"[Bench] Seeded {sizes['quiz_results']} results and {sizes['mistakes']} mistakes in {seeded_s}s")
+
+        options = [row.options_json for row in
+                   db.session.query(MistakeBank.options_json).filter_by(user_id=user_id).all()]
+    bench("options_json decode (quiz_page)", lambda: json.loads(options[0]), runs=repeat * 100)
+    bench(f"options_json decode x{len(options)} (review_mistakes)",
+          lambda: [json.loads(o) if o else {} for o in options], rows=len(options))
+
+    client = app.test_client()
+    login = client.post("/login", data={"login_id": "bench", "password": datasets.PASSWORD})
+    if login.status_code not in (200, 302):
+        raise RuntimeError(f"Login failed with {login.status_code}")
+
+    answers = [[q_id, "A", True] for q_id in question_ids[:10]]
+
+    def reload_results():
+        with client.session_transaction() as s:
+            s.update(score=len(answers), user_answers=answers, quiz_topic=datasets.TOPICS[0],
+                     quiz_difficulty="medium", saved_result_id=saved_id)
+        _assert_ok(client.get("/results"))
+
+    def quiz_page():
+        with client.session_transaction() as s:
+            s.update(active_questions=question_ids, current_idx=0)
+        _assert_ok(client.get(f"/quiz/{question_ids[0]}"))
+
+    bench("GET /dashboard", lambda: _assert_ok(client.get("/dashboard")))
+    bench("GET /results (reload)", reload_results, results=sizes["quiz_results"])
+    bench("GET /library", lambda: _assert_ok(client.get("/library")), results=sizes["quiz_results"])
+    bench("GET /review-mistakes", lambda: _assert_ok(client.get("/review-mistakes")),
+          runs=max(3, repeat // 4), mistakes=sizes["mistakes"])
+    bench("GET /quiz/<id>", quiz_page)
+    return results
+
+
+def compare(current, previous, threshold):
+    """Print median changes against an earlier run; return the names that regressed."""
+    regressions = []
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:48} {before['median_ms']:>10.2f} -> {result['median_ms']:>10.2f} ms  ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Use the small dataset.")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per benchmark.")
+    parser.add_argument("--only", action="append", help="Run only benchmarks whose name contains this.")
+    parser.add_argument("--database-url", help="Database to seed (default: a temporary SQLite file).")
+    parser.add_argument("--output", help="Where to write the JSON results.")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Median ratio counted as a regression.")
+    args = parser.parse_args(argv)
+
+    size = "quick" if args.quick else "full"
+    with tempfile.TemporaryDirectory(prefix="aq-bench-") as workdir:
+        _configure_env(workdir, args.database_url)
+        sys.path.insert(0, ROOT)
+        results = run_benchmarks(size, args.repeat, args.only)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": {"size": size, **SIZES[size]},
+        "repeat": args.repeat,
+        "benchmarks": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['commit'] or 'local'}-{size}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Wrote {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("dataset", {}).get("size") != size:
+            print("[Bench] Warning: comparing runs with different dataset sizes")
+        regressions = compare(results, previous.get("benchmarks", {}), args.threshold)
+        if regressions:
+            print(f"[Bench] {len(regressions)} benchmark(s) regressed beyond {args.threshold}x")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
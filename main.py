@@ -8,6 +8,7 @@ from flask_login import LoginManager
 from dotenv import load_dotenv
 
 from backend.models import db, User
+from backend.migrations import run_migrations
 
 # Only load .env file during local development, not on Vercel
 if not os.environ.get("VERCEL"):
@@ -23,6 +24,10 @@ def create_app():
         static_url_path="/static",
     )
 
+    # Uploads are hashed as they stream in, so repeat uploads skip extraction
+    from backend.documents import HashingRequest
+    app.request_class = HashingRequest
+
     # ── Configuration ────────────────────────────────────────────
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "adaptive-quiz-dev-key-2026")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
@@ -42,9 +47,14 @@ def create_app():
         app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
 
 
-    # Uploads
-    app.config["UPLOAD_FOLDER"] = "/tmp/uploads"
-    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    # Sessions — server-side by default; the cookie holds only an opaque id.
+    # Serverless instances don't share local disk, so Vercel keeps cookie sessions.
+    session_store = os.getenv("SESSION_STORE", "cookie" if os.environ.get("VERCEL") else "server")
+    if session_store == "server":
+        from backend.sessions import SqliteSessionInterface
+        app.session_interface = SqliteSessionInterface()
+
+    # Uploads (parsed in memory — nothing is written to disk)
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
 
     # ── Extensions ───────────────────────────────────────────────
@@ -69,10 +79,19 @@ def create_app():
     from backend.routes import routes_bp
     app.register_blueprint(routes_bp)
 
+    # ── Metrics ──────────────────────────────────────────────────
+    from backend import metrics
+    metrics.init_app(app)
+
+    # ── CLI commands ─────────────────────────────────────────────
+    from backend.cli import register_commands
+    register_commands(app)
+
     # ── Create tables ────────────────────────────────────────────
     with app.app_context():
         try:
             db.create_all()
+            run_migrations(db.engine)
             print("[App] Database tables initialized successfully")
         except Exception as e:
             print(f"[App] Warning: Could not initialize database tables: {e}")
@@ -93,8 +112,10 @@ def create_app():
     return app
 
 
-# Create the app instance (Vercel uses this)
-app = create_app()
+# Create the app instance (Vercel uses this). Spawned PDF workers re-import
+# this file as __mp_main__ and must not build an app of their own.
+if __name__ != "__mp_main__":
+    app = create_app()
 
 
 # For running directly